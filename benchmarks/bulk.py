@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""
+Compares loading objects one save() at a time with bulk_insert()
+Reports rows/sec for both on FileStorage and on a SQLite DBStorage
+
+Usage: ./benchmarks/bulk.py [<count>]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.state import State
+
+
+def rows(count):
+    """Yields count state rows"""
+    for i in range(count):
+        yield {'name': 'State {}'.format(i)}
+
+
+def one_by_one(storage, count):
+    """Returns rows/sec saving each new object on its own"""
+    start = time.perf_counter()
+    for row in rows(count):
+        state = State()
+        state.name = row['name']
+        storage.new(state)
+        storage.save()
+    return count / (time.perf_counter() - start)
+
+
+def remove(path):
+    """Removes path and the files SQLite keeps next to it"""
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def storages():
+    """Yields a name and a fresh, empty storage of each engine"""
+    remove('bench_bulk.json')
+    yield 'file', FileStorage(file_path='bench_bulk.json')
+    remove('bench_bulk.json')
+    remove('bench_bulk.db')
+    storage = SQLiteStorage('bench_bulk.db')
+    storage.reload()
+    yield 'sqlite', storage
+    storage.close()
+    storage.engine.dispose()
+    remove('bench_bulk.db')
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name, storage in storages():
+        single = one_by_one(storage, count)
+        result = storage.bulk_insert(State, rows(count))
+        print('{:6} {:10.0f} save()/sec {:10.0f} bulk rows/sec'.format(
+            name, single, result.rate))
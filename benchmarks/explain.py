@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""
+Shows the plan SQLite picks for each storage lookup, before and after
+the migrations add the lookup indexes
+
+Usage: ./benchmarks/explain.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from models.engine import migrations
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+PATH = 'bench_explain.db'
+
+
+def remove(path):
+    """Removes path and the files SQLite keeps next to it"""
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def downgrade(engine):
+    """Drops every lookup index and the recorded schema versions"""
+    with engine.begin() as conn:
+        for table in inspect(conn).get_table_names():
+            for index in inspect(conn).get_indexes(table):
+                if index['name'].startswith('ix_'):
+                    conn.execute(text('DROP INDEX ' + index['name']))
+        conn.execute(migrations.schema_version.delete())
+    engine.dispose()
+
+
+def show(storage, title):
+    """Prints the plan of each lookup query"""
+    print('==', title)
+    for query in (storage.query(City).filter(state_id='x'),
+                  storage.query(Place).filter(city_id='x'),
+                  storage.query(Place).filter(user_id='x'),
+                  storage.query(Review).filter(place_id='x'),
+                  storage.query(User).filter(email='x'),
+                  storage.query(State).filter(name='x')):
+        plan = ' / '.join(storage.explain(query))
+        print('{:8} {:10} {}'.format(query.cls.__name__,
+                                     ','.join(query.criteria), plan))
+
+
+if __name__ == '__main__':
+    remove(PATH)
+    storage = SQLiteStorage(PATH)
+    storage.reload()
+    downgrade(storage.engine)
+    show(storage, 'before')
+    print('migrated to', migrations.migrate(storage.engine))
+    show(storage, 'after')
+    storage.close()
+    storage.engine.dispose()
+    remove(PATH)
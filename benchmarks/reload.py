@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""
+Compares the FileStorage loaders on a storage file
+Reports objects/sec and peak traced memory for the old json.load loader,
+the streaming reload() and a parallel reload of the same data split
+into one hashed shard per core
+
+Usage: ./benchmarks/reload.py [<count>] [<file_path>]
+A file with <count> synthetic places is generated when none is given.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+def generate(path, count):
+    """Writes count places to path through FileStorage"""
+    storage = FileStorage(file_path=path)
+    for i in range(count):
+        place = Place()
+        place.name = 'Place {}'.format(i)
+        place.city_id = 'city-{}'.format(i % 100)
+        place.user_id = 'user-{}'.format(i % 1000)
+        place.description = 'x' * 200
+        storage.new(place)
+    storage.save()
+
+
+def load_json(path):
+    """The loader FileStorage used before streaming: json.load then build"""
+    classes = FileStorage.classes()
+    objects = {}
+    with open(path, 'r') as f:
+        temp = json.load(f)
+        for key, val in temp.items():
+            objects[key] = classes[val['__class__']](**val)
+    return len(objects)
+
+
+def load_stream(path):
+    """The streaming FileStorage.reload()"""
+    storage = FileStorage(file_path=path)
+    storage.reload()
+    return storage.count()
+
+
+def shard(path):
+    """Copies path into os.cpu_count() hashed shards, returns their root"""
+    root, ext = os.path.splitext(path)
+    sharded = root + '_sharded' + ext
+    source = FileStorage(file_path=path, lazy=True)
+    source.reload()
+    target = FileStorage(file_path=sharded, shards=os.cpu_count())
+    for obj in source.all().values():
+        target.new(obj)
+    target.save()
+    return sharded
+
+
+def load_sharded(path):
+    """FileStorage.reload() over hashed shards on a process pool"""
+    storage = FileStorage(file_path=path, shards=os.cpu_count())
+    storage.reload()
+    return storage.count()
+
+
+def measure(loader, path):
+    """Returns objects/sec and peak traced MiB for one loader"""
+    start = time.perf_counter()
+    count = loader(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    loader(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count / elapsed, peak / (1 << 20)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    path = sys.argv[2] if len(sys.argv) > 2 else 'bench_reload.json'
+    generated = not os.path.exists(path)
+    if generated:
+        generate(path, count)
+    print('{} ({} bytes)'.format(path, os.path.getsize(path)))
+    loaders = [('stream', load_stream)]
+    if not path.endswith('.jsonl'):
+        loaders.insert(0, ('json', load_json))
+    for name, loader in loaders:
+        rate, peak = measure(loader, path)
+        print('{:8} {:12.0f} objects/sec {:10.1f} MiB peak'.format(
+            name, rate, peak))
+    sharded = shard(path)
+    rate, peak = measure(load_sharded, sharded)
+    print('{:8} {:12.0f} objects/sec {:10.1f} MiB peak ({} shards)'.format(
+        'sharded', rate, peak, os.cpu_count()))
+    root, ext = os.path.splitext(sharded)
+    for i in range(os.cpu_count()):
+        os.remove('{}.{}{}'.format(root, i, ext))
+    if generated:
+        os.remove(path)
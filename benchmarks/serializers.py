@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+"""
+Compares the FileStorage snapshot formats
+Reports file size and the best records/sec of three rounds writing
+and reading the same records as file.json, line-delimited JSON and the binary format
+
+Usage: ./benchmarks/serializers.py [<count>]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.engine import serializers
+from reload import generate
+
+
+def measure(path, records, runs=3):
+    """Returns bytes on disk, write and read records/sec for one format
+
+    The best of runs rounds is kept, single rounds are noisy.
+    """
+    serializer = serializers.for_path(path)
+    write = read = 0
+    for i in range(runs):
+        start = time.perf_counter()
+        with serializers.open_file(path, 'w') as f:
+            serializer.write(f, records)
+        write = max(write, len(records) / (time.perf_counter() - start))
+        start = time.perf_counter()
+        with serializers.open_file(path, 'r') as f:
+            count = sum(1 for item in serializer.read(f))
+        read = max(read, count / (time.perf_counter() - start))
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size, write, read
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    generate('bench_formats.json', count)
+    records = serializers.read_file('bench_formats.json')
+    os.remove('bench_formats.json')
+    for ext in ('.json', '.jsonl', '.hbnb'):
+        size, write, read = measure('bench_formats' + ext, records)
+        print('{:6} {:12} bytes {:10.0f} writes/sec {:10.0f} reads/sec'.format(
+            ext, size, write, read))
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""
+Measures the Python overhead per call of DBStorage get(), count() and
+all(cls) on a small SQLite database, with statements rebuilt on every
+call and no compiled cache, with statements rebuilt, and with the
+prebuilt statements of models.engine.db_storage.statement()
+
+Usage: ./benchmarks/statements.py [<calls>]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.engine import db_storage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.state import State
+
+PATH = 'bench_statements.db'
+
+
+def remove(path):
+    """Removes path and the files SQLite keeps next to it"""
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def per_call(func, calls):
+    """Returns the microseconds one call of func takes"""
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def run(calls):
+    """Prints the cost of each operation on a fresh storage"""
+    storage = SQLiteStorage(PATH, cache_size=0)
+    storage.reload()
+    ids = [s.id for s in storage.all(State).values()]
+
+    def get(i):
+        """Looks a state up in a new session"""
+        storage.close()
+        storage.get('State', ids[i % len(ids)])
+    timings = (per_call(get, calls) - per_call(lambda i: storage.close(),
+                                               calls),
+               per_call(lambda i: storage.count('State'), calls),
+               per_call(lambda i: storage.count(), calls),
+               per_call(lambda i: storage.all(State), calls // 10))
+    storage.close()
+    storage.engine.dispose()
+    return timings
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    remove(PATH)
+    storage = SQLiteStorage(PATH)
+    storage.reload()
+    storage.bulk_insert(State, ({'name': 'State {}'.format(i)}
+                                for i in range(100)))
+    storage.engine.dispose()
+    prebuilt = db_storage.statement
+    print('{:28} {:>9} {:>9} {:>9} {:>9}'.format(
+        'us/call', 'get', 'count', 'count()', 'all'))
+    for name, cache, build in (('rebuilt, no compiled cache', '0',
+                                prebuilt.__wrapped__),
+                               ('rebuilt', '500', prebuilt.__wrapped__),
+                               ('prebuilt', '500', prebuilt)):
+        os.environ['HBNB_DB_QUERY_CACHE_SIZE'] = cache
+        db_storage.statement = build
+        print('{:28} {:9.1f} {:9.1f} {:9.1f} {:9.1f}'.format(
+            name, *run(calls)))
+    db_storage.statement = prebuilt
+    remove(PATH)
@@ -4,7 +4,7 @@ import cmd
 import sys
 import re
 from models.base_model import BaseModel
-from models.__init__ import storage
+from models import storage
 from models.user import User
 from models.place import Place
 from models.state import State
@@ -175,11 +175,11 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        try:
-            print(storage._FileStorage__objects[key])
-        except KeyError:
+        obj = storage.get(c_name, c_id)
+        if obj is None:
             print("** no instance found **")
+        else:
+            print(obj)
 
     def help_show(self):
         """ Help information for the show command """
@@ -206,13 +206,12 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-
-        try:
-            del(storage.all()[key])
-            storage.save()
-        except KeyError:
+        obj = storage.get(c_name, c_id)
+        if obj is None:
             print("** no instance found **")
+            return
+        storage.delete(obj)
+        storage.save()
 
     def help_destroy(self):
         """ Help information for the destroy command """
@@ -221,20 +220,22 @@ class HBNBCommand(cmd.Cmd):
 
     def do_all(self, args):
         """ Shows all objects, or all objects of a class"""
-        print_list = []
+        cls = None
 
         if args:
             args = args.split(' ')[0]  # remove possible trailing args
             if args not in HBNBCommand.classes:
                 print("** class doesn't exist **")
                 return
-            for k, v in storage.all(args).items():
-                print_list.append(str(v))
-        else:
-            for k, v in storage.all().items():
-                print_list.append(str(v))
+            cls = args
 
-        print(print_list)
+        # print like a list of str(obj) without holding every string
+        sep = ''
+        print('[', end='')
+        for obj in storage.iter_all(cls):
+            print(sep + repr(str(obj)), end='')
+            sep = ', '
+        print(']')
 
     def help_all(self):
         """ Help information for the all command """
@@ -243,11 +244,11 @@ class HBNBCommand(cmd.Cmd):
 
     def do_count(self, args):
         """Count current number of class instances"""
-        count = 0
-        for k, v in storage._FileStorage__objects.items():
-            if args == k.split('.')[0]:
-                count += 1
-        print(count)
+        args = args.split(' ')[0]  # remove possible trailing args
+        if args not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+        print(storage.count(args))
 
     def help_count(self):
         """ """
@@ -276,11 +277,9 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        # generate key from class and id
-        key = c_name + "." + c_id
-
-        # determine if key is present
-        if key not in storage.all():
+        # determine if instance is present
+        new_dict = storage.get(c_name, c_id)
+        if new_dict is None:
             print("** no instance found **")
             return
 
@@ -313,9 +312,6 @@ class HBNBCommand(cmd.Cmd):
 
             args = [att_name, att_val]
 
-        # retrieve dictionary of current objects
-        new_dict = storage.all()[key]
-
         # iterate through attr names and values
         for i, att_name in enumerate(args):
             # block only runs on even iterations
@@ -331,8 +327,8 @@ class HBNBCommand(cmd.Cmd):
                 if att_name in HBNBCommand.types:
                     att_val = HBNBCommand.types[att_name](att_val)
 
-                # update dictionary with name, value pair
-                new_dict.__dict__.update({att_name: att_val})
+                # set attribute so the change is tracked
+                setattr(new_dict, att_name, att_val)
 
         new_dict.save()  # save updates to file
 
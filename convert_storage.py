@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+"""
+Converts a FileStorage snapshot between formats
+The format of each file is taken from its extension (.json, .jsonl or
+.hbnb), see models/engine/serializers.py
+
+Usage: ./convert_storage.py <source> <destination>
+Example: ./convert_storage.py file.json file.hbnb
+"""
+import sys
+from models.engine.serializers import convert
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: {} <source> <destination>'.format(sys.argv[0]))
+        sys.exit(1)
+    count = convert(sys.argv[1], sys.argv[2])
+    print('{} records written to {}'.format(count, sys.argv[2]))
@@ -7,6 +7,9 @@ storage_type = getenv('HBNB_TYPE_STORAGE')
 if storage_type == 'db':
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
+elif storage_type == 'sqlite':
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
 else:
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
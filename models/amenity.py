@@ -11,7 +11,7 @@ class Amenity(BaseModel, Base):
     
     name = Column(String(128), nullable=False)
     
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'):
         place_amenities = relationship('Place', secondary='place_amenity',
                                      back_populates='amenities')
     else:
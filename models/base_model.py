@@ -1,14 +1,23 @@
 #!/usr/bin/python3
 """This module defines a base class for all models in our hbnb clone"""
 import uuid
+import weakref
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import Column, String, DateTime
 
 Base = declarative_base()
 
+# attribute names set on each instance since its last clear_changes()
+_changes = weakref.WeakKeyDictionary()
+
 class BaseModel:
-    """A base class for all hbnb models"""
+    """A base class for all hbnb models
+
+    Attribute assignments are recorded as changes until clear_changes()
+    is called. Writes made directly to __dict__ and in-place edits of a
+    mutable value are not seen; assign the attribute instead.
+    """
     id = Column(String(60), primary_key=True, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow())
     updated_at = Column(DateTime, nullable=False, default=datetime.utcnow())
@@ -37,6 +46,24 @@ class BaseModel:
                 pass
             self.__dict__.update(kwargs)
 
+    def __setattr__(self, name, value):
+        """Sets an attribute and records it as changed"""
+        super().__setattr__(name, value)
+        if name.startswith('_sa_'):
+            return
+        try:
+            _changes[self].add(name)
+        except KeyError:
+            _changes[self] = {name}
+
+    def changed_attributes(self):
+        """Returns the names of attributes set since the last clear"""
+        return frozenset(_changes.get(self, ()))
+
+    def clear_changes(self):
+        """Forgets the recorded changes, e.g. once they are persisted"""
+        _changes.pop(self, None)
+
     def __str__(self):
         """Returns a string representation of the instance"""
         dictionary = self.__dict__.copy()
@@ -10,9 +10,10 @@ class City(BaseModel, Base):
     __tablename__ = 'cities'
     
     name = Column(String(128), nullable=False)
-    state_id = Column(String(60), ForeignKey('states.id'), nullable=False)
+    state_id = Column(String(60), ForeignKey('states.id'), nullable=False,
+                      index=True)
     
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'):
         places = relationship('Place', backref='city', cascade='all, delete-orphan')
     else:
         @property
@@ -20,8 +21,4 @@ class City(BaseModel, Base):
             """Getter for places"""
             from models import storage
             from models.place import Place
-            place_list = []
-            for place in storage.all(Place).values():
-                if place.city_id == self.id:
-                    place_list.append(place)
-            return place_list
+            return storage.related(Place, 'city_id', self.id)
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+"""This module holds the helpers shared by the bulk loading APIs
+
+storage.bulk_insert(cls, rows) and storage.bulk_upsert(cls, rows) take
+an iterable of attribute dicts and return a BulkResult telling how many
+rows were stored, in how many seconds and at what rate.
+"""
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+BulkResult = namedtuple('BulkResult', 'rows seconds rate')
+
+
+def records(rows):
+    """Yields a copy of each row with its id and timestamps filled in
+
+    Timestamps given as isoformat strings are turned into datetimes.
+    """
+    now = datetime.utcnow()
+    for row in rows:
+        record = dict(row)
+        record.pop('__class__', None)
+        if 'id' not in record:
+            record['id'] = str(uuid.uuid4())
+        for name in ('created_at', 'updated_at'):
+            value = record.get(name, now)
+            if type(value) is str:
+                value = datetime.fromisoformat(value)
+            record[name] = value
+        yield record
+
+
+def chunks(iterable, size):
+    """Yields lists of up to size items of iterable"""
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def result(rows, start):
+    """Returns the BulkResult of storing rows since perf_counter() start"""
+    seconds = time.perf_counter() - start
+    return BulkResult(rows, seconds, rows / seconds if seconds else 0.0)
@@ -1,9 +1,26 @@
 #!/usr/bin/python3
 """This module defines a class to manage database storage for hbnb clone"""
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import copy
+from functools import lru_cache
+from itertools import chain, cycle
+from sqlalchemy import bindparam, create_engine, event, func, insert, inspect
+from sqlalchemy import literal
+from sqlalchemy import select, text, union_all
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import DBAPIError, DisconnectionError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.orm.util import identity_key
 from models.base_model import Base
+from models.engine import bulk, migrations
+from models.engine.query import Query, read_cursor
 from models.state import State
 from models.city import City
 from models.user import User
@@ -11,85 +28,806 @@ from models.place import Place
 from models.review import Review
 from models.amenity import Amenity
 
+classes = {
+    'State': State, 'City': City, 'User': User,
+    'Place': Place, 'Review': Review, 'Amenity': Amenity
+}
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+ResultCacheInfo = namedtuple('ResultCacheInfo',
+                             'hits misses hit_rate maxsize currsize entries')
+PoolInfo = namedtuple('PoolInfo', 'checkouts wait_total wait_max size '
+                      'checked_out overflow')
+
+
+class TimedPool(QueuePool):
+    """A QueuePool recording how long each checkout waited"""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the pool with empty wait metrics"""
+        super().__init__(*args, **kwargs)
+        self.waits = [0, 0.0, 0.0]
+        self.waits_lock = threading.Lock()
+
+    def _do_get(self):
+        """Checks a connection out, timing the wait"""
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self.waits_lock:
+                self.waits[0] += 1
+                self.waits[1] += waited
+                self.waits[2] = max(self.waits[2], waited)
+
+    def recreate(self):
+        """Returns a new pool like this one, keeping the metrics"""
+        pool = super().recreate()
+        pool.waits, pool.waits_lock = self.waits, self.waits_lock
+        return pool
+
+
+def make_engine(url, **kwargs):
+    """Returns an engine on url with a pool sized from the environment
+
+        HBNB_DB_POOL_SIZE       connections kept open (5)
+        HBNB_DB_MAX_OVERFLOW    extra connections under load (10)
+        HBNB_DB_POOL_RECYCLE    seconds before a connection is replaced
+                                (1800, -1 never)
+        HBNB_DB_PING_INTERVAL   seconds a connection may sit idle before
+                                it is pinged on checkout (30, 0 always,
+                                -1 never)
+        HBNB_DB_QUERY_CACHE_SIZE
+                                compiled statements kept (500, 0 none)
+    """
+    interval = float(os.getenv('HBNB_DB_PING_INTERVAL') or 30)
+    engine = create_engine(
+        url, poolclass=TimedPool,
+        pool_size=int(os.getenv('HBNB_DB_POOL_SIZE') or 5),
+        max_overflow=int(os.getenv('HBNB_DB_MAX_OVERFLOW') or 10),
+        pool_recycle=int(os.getenv('HBNB_DB_POOL_RECYCLE') or 1800),
+        pool_pre_ping=interval == 0,
+        query_cache_size=int(os.getenv('HBNB_DB_QUERY_CACHE_SIZE') or 500),
+        **kwargs)
+    if interval > 0:
+        event.listen(engine, 'checkin', _checked_in)
+        event.listen(engine, 'checkout',
+                     lambda conn, record, proxy: _ping(conn, record,
+                                                       interval))
+    return engine
+
+
+def _checked_in(connection, record):
+    """Remembers when a connection went back to the pool"""
+    record.info['checked_in'] = time.monotonic()
+
+
+def _ping(connection, record, interval):
+    """Pings a connection that sat idle longer than interval seconds
+
+    A failed ping makes the pool retry with a fresh connection.
+    """
+    checked_in = record.info.get('checked_in')
+    if checked_in is None or time.monotonic() - checked_in <= interval:
+        return
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+    except Exception as e:
+        raise DisconnectionError() from e
+
+
+class RoutingSession(Session):
+    """A session writing to its bind, the primary, and reading from replicas
+
+    Statements changing rows, flushes and the reads that follow them in
+    the same transaction go to the primary, other reads to the next
+    replica in turn. With read_your_writes a session that committed a
+    write keeps reading from the primary until it is closed.
+    """
+
+    def __init__(self, replicas=None, read_your_writes=False, **kwargs):
+        """Initialize the session on an endless iterator of replicas"""
+        super().__init__(**kwargs)
+        self.replicas = replicas
+        self.read_your_writes = read_your_writes
+        self.wrote = False
+        self.pinned = False
+
+    def reads_primary(self):
+        """Returns True when reads must see the primary"""
+        return self.replicas is None or self.wrote or self.pinned
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Returns the engine the statement clause should run on"""
+        if getattr(clause, 'is_dml', False):
+            self.wrote = True
+        if self.reads_primary():
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return next(self.replicas)
+
+
+def _flushing(session, flush_context, instances):
+    """Sends the rest of the transaction to the primary"""
+    session.wrote = True
+
+
+def _committed(session):
+    """Pins a session that wrote to the primary if it reads its writes"""
+    if session.wrote and session.read_your_writes:
+        session.pinned = True
+    session.wrote = False
+
+
+def _rolled_back(session):
+    """Lets a session read from replicas again after a rollback"""
+    session.wrote = False
+
+
+event.listen(RoutingSession, 'before_flush', _flushing)
+event.listen(RoutingSession, 'after_commit', _committed)
+event.listen(RoutingSession, 'after_rollback', _rolled_back)
+
+
+@lru_cache(maxsize=None)
+def statement(cls, operation):
+    """Returns the statement running operation on cls, built once
+
+        'all'    every object of cls
+        'get'    the object of cls whose id is the :id parameter
+        'count'  the table name of cls and its number of rows, of every
+                 class with cls None
+
+    A statement object remembers its cache key, so running the same one
+    again goes straight to the compiled form in the engine's cache.
+    """
+    if operation == 'count' and cls is None:
+        return union_all(*(statement(c, 'count') for c in classes.values()))
+    if operation == 'all':
+        return select(cls)
+    if operation == 'get':
+        return select(cls).where(cls.id == bindparam('id'))
+    if operation == 'count':
+        return select(literal(cls.__tablename__),
+                      func.count()).select_from(cls.__table__)
+    raise ValueError('Unknown operation {!r}'.format(operation))
+
+
+def _read_tables(cls, paths=()):
+    """Returns the tables read to load cls with relationship paths"""
+    names = {cls.__tablename__}
+    for path in paths:
+        owner = cls
+        for name in path.split('.'):
+            prop = getattr(owner, name).property
+            owner = prop.mapper.class_
+            names.add(owner.__tablename__)
+            if prop.secondary is not None:
+                names.add(prop.secondary.name)
+    return frozenset(names)
+
+
+@lru_cache(maxsize=None)
+def _written_tables(cls):
+    """Returns the tables a flush of a cls object may write to"""
+    return frozenset([cls.__tablename__] +
+                     [rel.secondary.name for rel in inspect(cls).relationships
+                      if rel.secondary is not None])
+
+
+class _SessionState(threading.local):
+    """Batch depth and pending writes of the session of one thread"""
+    batch_depth = 0
+    uncommitted = False
+
 
 class DBStorage:
-    """This class manages storage of hbnb models in MySQL database"""
+    """This class manages storage of hbnb models in MySQL database
+
+    get() keeps the last HBNB_DB_CACHE_SIZE objects it returned (1024 by
+    default, 0 turns the cache off) for HBNB_DB_CACHE_TTL seconds (60).
+    A cached object is attached to the current session without a query.
+    new(), delete() and the commit of save() drop the objects they touch,
+    cache_info() reports hits and misses.
+
+    all() without a class loads the tables concurrently on their own
+    connections when the session holds no uncommitted rows, on threads
+    shared by every call and at most one per pooled connection. Pools
+    that do not give each thread its own connection, like the ones of
+    in-memory SQLite, and a pool with at most one idle connection left
+    get the tables read one by one.
+
+    Each thread gets its own session and close() removes it. See
+    make_engine() for the pool settings and pool_info() for its use.
+
+    Reads are spread over the replica URLs in HBNB_DB_REPLICAS (comma
+    separated) while writes go to the primary, see RoutingSession.
+    HBNB_DB_READ_YOUR_WRITES=1 keeps a session on the primary once it
+    committed a write.
+
+    all(cls) and the query API can keep their results too, up to
+    HBNB_DB_RESULT_CACHE_SIZE objects in all (0 by default, off) for
+    HBNB_DB_RESULT_CACHE_TTL seconds (60), which bounds how long writes
+    of other processes go unseen. Committing a change to a table drops
+    the results read from it, result_cache_info() reports the hit rate.
+    A session with uncommitted changes neither reads nor fills the cache.
+    """
     __engine = None
     __session = None
+    __factory = None
+
+    def __init__(self, engine=None, cache_size=None, cache_ttl=None,
+                 replicas=None, read_your_writes=None,
+                 result_cache_size=None, result_cache_ttl=None):
+        """Initialize DBStorage on engine, the MySQL server by default
 
-    def __init__(self):
-        """Initialize DBStorage"""
-        user = os.getenv('HBNB_MYSQL_USER')
-        pwd = os.getenv('HBNB_MYSQL_PWD')
-        host = os.getenv('HBNB_MYSQL_HOST')
-        db = os.getenv('HBNB_MYSQL_DB')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.format(user, pwd, host, db), pool_pre_ping=True)
+        replicas lists engines or URLs to read from.
+        """
+        if cache_size is None:
+            cache_size = os.getenv('HBNB_DB_CACHE_SIZE') or 1024
+        if cache_ttl is None:
+            cache_ttl = os.getenv('HBNB_DB_CACHE_TTL') or 60
+        self.__cache_size = int(cache_size)
+        self.__cache_ttl = float(cache_ttl)
+        self.__cache = OrderedDict()
+        self.__cache_lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        if result_cache_size is None:
+            result_cache_size = os.getenv('HBNB_DB_RESULT_CACHE_SIZE') or 0
+        if result_cache_ttl is None:
+            result_cache_ttl = os.getenv('HBNB_DB_RESULT_CACHE_TTL') or 60
+        self.__results_size = int(result_cache_size)
+        self.__results_ttl = float(result_cache_ttl)
+        self.__results = OrderedDict()
+        self.__results_held = 0
+        self.__results_hits = 0
+        self.__results_misses = 0
+        self.__table_versions = {}
+        self.__local = _SessionState()
+        self.__readers = None
+        self.__readers_lock = threading.Lock()
+        if engine is None:
+            user = os.getenv('HBNB_MYSQL_USER')
+            pwd = os.getenv('HBNB_MYSQL_PWD')
+            host = os.getenv('HBNB_MYSQL_HOST')
+            db = os.getenv('HBNB_MYSQL_DB')
+            engine = make_engine('mysql+mysqldb://{}:{}@{}/{}'.format(user, pwd, host, db))
+        self.__engine = engine
+        if replicas is None:
+            replicas = [url for url in
+                        os.getenv('HBNB_DB_REPLICAS', '').split(',') if url]
+        self.__replicas = tuple(make_engine(r) if type(r) is str else r
+                                for r in replicas)
+        if read_your_writes is None:
+            read_your_writes = os.getenv('HBNB_DB_READ_YOUR_WRITES',
+                                         '') in ('1', 'true')
+        self.__read_your_writes = read_your_writes
         if os.getenv('HBNB_ENV') == 'test':
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
-        """Query on the current database session all objects depending of the class name"""
-        classes = {
-            'State': State, 'City': City, 'User': User,
-            'Place': Place, 'Review': Review, 'Amenity': Amenity
-        }
+    @property
+    def engine(self):
+        """The SQLAlchemy engine the storage runs on"""
+        return self.__engine
+
+    @property
+    def replicas(self):
+        """The engines reads are spread over, empty without replicas"""
+        return self.__replicas
+
+    def all(self, cls=None, load=None):
+        """Query on the current database session all objects depending of the class name
+
+        load lists relationships of cls to fetch along, like ['cities'] or
+        ['cities.places'], in one query each instead of one per object.
+        """
         result = {}
         if cls is not None:
             if type(cls) is str:
                 cls = classes[cls]
-            for obj in self.__session.query(cls).all():
+            stmt = statement(cls, 'all')
+            if load:
+                stmt = stmt.options(*self.__loaders(cls, load))
+            objs = self.__cached(
+                ('all', cls, tuple(load or ())), _read_tables(cls, load or ()),
+                lambda: self.__session.scalars(stmt).all())
+            for obj in objs:
                 key = obj.__class__.__name__ + '.' + obj.id
                 result[key] = obj
         else:
-            for cls_name, cls_obj in classes.items():
-                for obj in self.__session.query(cls_obj).all():
-                    key = obj.__class__.__name__ + '.' + obj.id
-                    result[key] = obj
+            for obj in self.__all_classes():
+                key = obj.__class__.__name__ + '.' + obj.id
+                result[key] = obj
         return result
 
+    def __all_classes(self):
+        """Returns the objects of every class, fetched concurrently
+
+        Other connections cannot see rows this session has not committed,
+        so the tables are then read in this session one by one, as they
+        are when the pools cannot spare connections.
+        """
+        session = self.__session()
+        readers = self.__reader_pool()
+        if self.__local.uncommitted or session.new or session.deleted or \
+                readers is None:
+            return [obj for cls in classes.values()
+                    for obj in session.scalars(statement(cls, 'all'))]
+        primary = [session.reads_primary()] * len(classes)
+        fetched = list(readers.map(self.__fetch, classes.values(), primary))
+        objs = []
+        for obj in chain.from_iterable(fetched):
+            # keep the instance this session already has, with its changes
+            known = session.identity_map.get(
+                identity_key(type(obj), obj.id))
+            objs.append(known if known is not None
+                        else session.merge(obj, load=False))
+        return objs
+
+    @staticmethod
+    def __loaders(cls, paths):
+        """Returns the eager loading options for relationship paths
+
+        Collections are loaded with one SELECT ... IN per level, single
+        objects are joined to the query that loads their owner.
+        """
+        options = []
+        for path in paths:
+            option, owner = None, cls
+            for name in path.split('.'):
+                attr = getattr(owner, name)
+                loader = selectinload if attr.property.uselist \
+                    else joinedload
+                option = loader(attr) if option is None \
+                    else getattr(option, loader.__name__)(attr)
+                owner = attr.property.mapper.class_
+            options.append(option)
+        return options
+
+    def __reader_pool(self):
+        """Returns the executor all() reads tables on, None to read serially
+
+        Its threads are made once, no more than the smallest pool holds.
+        """
+        idle = []
+        for engine in (self.__engine,) + self.__replicas:
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                return None
+            idle.append(pool.size() - pool.checkedout())
+        if min(idle) < 2:
+            return None
+        with self.__readers_lock:
+            if self.__readers is None:
+                size = min(engine.pool.size() for engine
+                           in (self.__engine,) + self.__replicas)
+                self.__readers = ThreadPoolExecutor(
+                    max_workers=min(len(classes), size),
+                    thread_name_prefix='DBStorage reader')
+            return self.__readers
+
+    def __fetch(self, cls, primary):
+        """Loads every object of cls in a session of its own"""
+        session = self.__factory()
+        session.pinned = primary
+        try:
+            return session.scalars(statement(cls, 'all')).all()
+        finally:
+            session.close()
+
+    def iter_all(self, cls=None, batch_size=1000, after=None):
+        """Yields the objects of cls (all if None) by class name, then id
+
+        Rows are fetched batch_size at a time. after is a token from
+        query.cursor() to resume past an object.
+        """
+        if type(cls) is str:
+            cls = classes[cls]
+        start = None if after is None else read_cursor(after)
+        for name, c in sorted(classes.items()):
+            if cls is not None and c is not cls:
+                continue
+            if start is not None and name < start[0]:
+                continue
+            q = self.__session.query(c).order_by(c.id)
+            if start is not None and name == start[0]:
+                q = q.filter(c.id > start[1])
+            yield from q.yield_per(batch_size)
+
+    def query(self, cls):
+        """Returns a Query over the objects of cls, run as one SQL statement"""
+        if type(cls) is str:
+            cls = classes[cls]
+        return Query(cls, self.__select)
+
+    def __select(self, query, count):
+        """Compiles query to SQL on the current session"""
+        def fetch():
+            """Runs query"""
+            q = self.__orm_query(query, count)
+            return q.count() if count else q.all()
+        key = ('query', query.cls, tuple(sorted(query.criteria.items())),
+               query.ordering, query.first_row, query.max_rows, query.loads,
+               count)
+        return self.__cached(key, _read_tables(query.cls, query.loads),
+                             fetch)
+
+    def __cached(self, key, tables, fetch):
+        """Returns the result of fetch(), from the result cache if it is there
+
+        key describes the shape of the query and tables the ones it reads.
+        """
+        session = self.__session()
+        if self.__results_size <= 0 or self.__local.uncommitted or \
+                session.new or session.dirty or session.deleted:
+            return fetch()
+        try:
+            hash(key)
+        except TypeError:
+            return fetch()
+        with self.__cache_lock:
+            entry = self.__results.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.__results.move_to_end(key)
+                self.__results_hits += 1
+            else:
+                if entry is not None:
+                    self.__drop_result(key)
+                self.__results_misses += 1
+                entry = None
+            versions = [self.__table_versions.get(t, 0) for t in tables]
+        if entry is not None:
+            found = self.__adopt(session, entry[2])
+            if found is not None:
+                return found
+        found = fetch()
+        held = len(found) if type(found) is list else 1
+        with self.__cache_lock:
+            # a commit during fetch() may have made found stale already
+            if held <= self.__results_size and versions == \
+                    [self.__table_versions.get(t, 0) for t in tables]:
+                self.__drop_result(key)
+                self.__results[key] = (time.monotonic() + self.__results_ttl,
+                                       tables, copy(found), held)
+                self.__results_held += held
+                while self.__results_held > self.__results_size:
+                    self.__drop_result(next(iter(self.__results)))
+        return found
+
+    @staticmethod
+    def __adopt(session, found):
+        """Returns cached found in session, None if an object changed since"""
+        if type(found) is not list:
+            return found
+        adopted = []
+        for obj in found:
+            if obj not in session:
+                known = session.identity_map.get(
+                    identity_key(type(obj), obj.id))
+                if known is None:
+                    if inspect(obj).modified:
+                        return None
+                    known = session.merge(obj, load=False)
+                obj = known
+            adopted.append(obj)
+        return adopted
+
+    def __drop_result(self, key):
+        """Removes the result cached under key, the cache lock is held"""
+        entry = self.__results.pop(key, None)
+        if entry is not None:
+            self.__results_held -= entry[3]
+
+    def __invalidate(self, tables):
+        """Drops the cached results read from any of tables"""
+        with self.__cache_lock:
+            for table in tables:
+                self.__table_versions[table] = \
+                    self.__table_versions.get(table, 0) + 1
+            for key in [key for key, entry in self.__results.items()
+                        if entry[1] & tables]:
+                self.__drop_result(key)
+
+    @staticmethod
+    def __flushed(session, flush_context):
+        """Remembers the tables a flush wrote to until the commit"""
+        touched = session.info.setdefault('touched', set())
+        for obj in chain(session.new, session.dirty, session.deleted):
+            touched.update(_written_tables(type(obj)))
+
+    def __committed(self, session):
+        """Drops the cached results of the tables the commit changed"""
+        touched = session.info.pop('touched', None)
+        if touched:
+            self.__invalidate(touched)
+        session.info.pop('cached', None)
+
+    def __rolled_back(self, session):
+        """Forgets the changes a rollback undid, cached objects included"""
+        session.info.pop('touched', None)
+        self.__uncache(session)
+
+    def __uncache(self, session):
+        """Drops the objects session put in get()'s cache since its commit"""
+        keys = session.info.pop('cached', ())
+        with self.__cache_lock:
+            for key in keys:
+                self.__cache.pop(key, None)
+
+    def result_cache_info(self):
+        """Returns the hits, misses, hit rate, bounds and use of the cache"""
+        with self.__cache_lock:
+            lookups = self.__results_hits + self.__results_misses
+            return ResultCacheInfo(
+                self.__results_hits, self.__results_misses,
+                self.__results_hits / lookups if lookups else 0.0,
+                self.__results_size, self.__results_held, len(self.__results))
+
+    def __orm_query(self, query, count=False):
+        """Returns the ORM query for query, unsorted when counting it all"""
+        cls = query.cls
+        q = self.__session.query(cls).filter_by(**query.criteria)
+        if query.loads:
+            q = q.options(*self.__loaders(cls, query.loads))
+        if count and not query.first_row and query.max_rows is None:
+            return q
+        order = []
+        for name in query.ordering:
+            if name.startswith('-'):
+                order.append(getattr(cls, name[1:]).desc())
+            else:
+                order.append(getattr(cls, name))
+        q = q.order_by(*order, cls.id).offset(query.first_row)
+        return q.limit(query.max_rows)
+
+    def explain(self, query):
+        """Returns the plan the database picks for a Query, line by line"""
+        return migrations.explain(self.__engine,
+                                  self.__orm_query(query).statement)
+
     def new(self, obj):
         """Add the object to the current database session"""
+        self.__forget(obj)
         self.__session.add(obj)
+        self.__local.uncommitted = True
+
+    def bulk_insert(self, cls, rows, chunk_size=1000):
+        """Inserts cls rows from dicts of columns, see engine/bulk.py
+
+        Each chunk goes to the database as one executemany() of a Core
+        INSERT, so no model is built. Commits like save() and returns a
+        BulkResult.
+        """
+        return self.__bulk(cls, rows, chunk_size, False)
+
+    def bulk_upsert(self, cls, rows, chunk_size=1000):
+        """Like bulk_insert(), but a row whose id exists updates it"""
+        return self.__bulk(cls, rows, chunk_size, True)
+
+    def __bulk(self, cls, rows, chunk_size, update):
+        """Writes rows chunk by chunk with INSERT or upsert statements"""
+        start = time.perf_counter()
+        if type(cls) is str:
+            cls = classes[cls]
+        session = self.__session()
+        count = 0
+        for chunk in bulk.chunks(bulk.records(rows), chunk_size):
+            # executemany() needs the same columns in every row
+            groups = {}
+            for record in chunk:
+                groups.setdefault(tuple(record), []).append(record)
+            for names, group in groups.items():
+                stmt = insert(cls.__table__)
+                if update:
+                    stmt = self.__upsert(cls.__table__, names)
+                session.execute(stmt, group)
+            with self.__cache_lock:
+                for record in chunk:
+                    self.__cache.pop((cls, record['id']), None)
+            if update:
+                for record in chunk:
+                    obj = session.identity_map.get(
+                        identity_key(cls, record['id']))
+                    if obj is not None:
+                        session.expire(obj)
+            count += len(chunk)
+        session.info.setdefault('touched', set()).add(cls.__tablename__)
+        self.__local.uncommitted = True
+        self.save()
+        return bulk.result(count, start)
+
+    def __upsert(self, table, names):
+        """Returns an INSERT of table that updates names on a duplicate id"""
+        changed = [name for name in names
+                   if name not in ('id', 'created_at')] or ['id']
+        dialect = self.__engine.dialect.name
+        if dialect == 'sqlite':
+            stmt = sqlite.insert(table)
+            return stmt.on_conflict_do_update(
+                index_elements=['id'],
+                set_={name: stmt.excluded[name] for name in changed})
+        if dialect == 'mysql':
+            stmt = mysql.insert(table)
+            return stmt.on_duplicate_key_update(
+                {name: stmt.inserted[name] for name in changed})
+        raise ValueError('Upsert is not supported on {!r}'.format(dialect))
 
     def save(self):
-        """Commit all changes of the current database session"""
-        self.__session.commit()
+        """Commit all changes of the current database session
+
+        Inside a batch the commit is left to the end of the batch.
+        """
+        if not self.__local.batch_depth:
+            self.__commit()
+
+    def __commit(self):
+        """Commits the session, dropping the changed objects from cache"""
+        session = self.__session()
+        for obj in chain(session.new, session.dirty, session.deleted):
+            self.__forget(obj)
+        session.commit()
+        self.__local.uncommitted = False
+
+    @contextmanager
+    def batch(self):
+        """Commits once at the end of the block, rolls back on an exception
+
+        Nested batches join the outermost one.
+        """
+        self.__local.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.__local.batch_depth -= 1
+            if not self.__local.batch_depth:
+                self.__session.rollback()
+                self.__local.uncommitted = False
+            raise
+        self.__local.batch_depth -= 1
+        if not self.__local.batch_depth:
+            self.__commit()
 
     def delete(self, obj=None):
         """Delete from the current database session obj if not None"""
         if obj is not None:
+            self.__forget(obj)
             self.__session.delete(obj)
+            self.__local.uncommitted = True
 
     def reload(self):
-        """Create all tables in the database and create the current database session"""
+        """Create all tables, migrate them and create the current session"""
         Base.metadata.create_all(self.__engine)
-        session_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(session_factory)
-        self.__session = Session()
+        migrations.migrate(self.__engine)
+        replicas = cycle(self.__replicas) if self.__replicas else None
+        session_factory = sessionmaker(
+            bind=self.__engine, class_=RoutingSession, replicas=replicas,
+            read_your_writes=self.__read_your_writes, expire_on_commit=False)
+        event.listen(session_factory, 'after_flush', self.__flushed)
+        event.listen(session_factory, 'after_commit', self.__committed)
+        event.listen(session_factory, 'after_rollback', self.__rolled_back)
+        self.__factory = session_factory
+        self.__session = scoped_session(session_factory)
+        self.__local = _SessionState()
 
     def close(self):
-        """Close the current database session"""
-        self.__session.close()
+        """Close and discard the session of the current thread
+
+        Objects it cached for get() go too when it has uncommitted changes.
+        """
+        if self.__session.registry.has():
+            session = self.__session()
+            if self.__local.uncommitted or session.new or session.dirty or \
+                    session.deleted:
+                self.__uncache(session)
+        self.__session.remove()
+        self.__local.uncommitted = False
+        self.__local.batch_depth = 0
+
+    def pool_info(self):
+        """Returns checkout count and wait times, size and use of the pool"""
+        pool = self.__engine.pool
+        waits = getattr(pool, 'waits', (0, 0.0, 0.0))
+        size = checked_out = overflow = 0
+        if isinstance(pool, QueuePool):
+            size = pool.size()
+            checked_out = pool.checkedout()
+            overflow = max(pool.overflow(), 0)
+        return PoolInfo(waits[0], waits[1], waits[2], size, checked_out,
+                        overflow)
 
     def get(self, cls, id):
         """Retrieve one object based on class name and ID"""
         if cls is None or id is None:
             return None
         if type(cls) is str:
-            cls = eval(cls)
-        return self.__session.query(cls).filter(cls.id == id).first()
-
-    def count(self, cls=None):
-        """Count the number of objects in storage"""
-        if cls is None:
-            total = 0
-            total += self.__session.query(State).count()
-            total += self.__session.query(City).count()
-            total += self.__session.query(User).count()
-            total += self.__session.query(Place).count()
-            total += self.__session.query(Review).count()
-            total += self.__session.query(Amenity).count()
-            return total
+            cls = classes[cls]
+        key = (cls, id)
+        with self.__cache_lock:
+            entry = self.__cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.__cache.move_to_end(key)
+                self.__hits += 1
+            else:
+                self.__cache.pop(key, None)
+                self.__misses += 1
+                entry = None
+        session = self.__session()
+        if entry is not None and entry[1] in session:
+            return entry[1]
+        obj = session.identity_map.get(identity_key(cls, id))
+        if obj is None and entry is not None and \
+                not inspect(entry[1]).modified:
+            obj = session.merge(entry[1], load=False)
+        if obj is None:
+            obj = session.scalars(statement(cls, 'get'), {'id': id}).first()
+        # only rows the database committed are worth keeping
+        if obj is not None and self.__cache_size > 0 and \
+                not self.__local.uncommitted and inspect(obj).persistent:
+            session.info.setdefault('cached', set()).add(key)
+            with self.__cache_lock:
+                expires = entry[0] if entry else \
+                    time.monotonic() + self.__cache_ttl
+                self.__cache[key] = (expires, obj)
+                self.__cache.move_to_end(key)
+                while len(self.__cache) > self.__cache_size:
+                    self.__cache.popitem(last=False)
+        return obj
+
+    def cache_info(self):
+        """Returns the hits, misses, size bound and size of get()'s cache"""
+        with self.__cache_lock:
+            return CacheInfo(self.__hits, self.__misses, self.__cache_size,
+                             len(self.__cache))
+
+    def __forget(self, obj):
+        """Drops obj from get()'s cache"""
+        with self.__cache_lock:
+            self.__cache.pop((type(obj), getattr(obj, 'id', None)), None)
+
+    def count(self, cls=None, approximate=False):
+        """Count the number of objects in storage
+
+        Every class is counted in one statement. With approximate=True
+        the row estimates of the table statistics are used where the
+        server keeps them, which is much cheaper on large tables.
+        """
         if type(cls) is str:
-            cls = eval(cls)
-        return self.__session.query(cls).count() 
\ No newline at end of file
+            cls = classes[cls]
+        counted = list(classes.values()) if cls is None else [cls]
+        tables = [c.__tablename__ for c in counted]
+        counts = {}
+        if approximate:
+            counts = self.__estimates(tables)
+        missing = [c for c in counted if c.__tablename__ not in counts]
+        if len(missing) == len(counted):
+            stmt = statement(cls, 'count')
+        elif missing:
+            stmt = union_all(*(statement(c, 'count') for c in missing))
+        if missing:
+            counts.update(self.__session.execute(stmt).all())
+        return sum(counts[t] for t in tables)
+
+    def __estimates(self, tables):
+        """Returns the row estimate of each table the statistics know"""
+        dialect = self.__engine.dialect.name
+        if dialect == 'mysql':
+            stmt = text('SELECT table_name, table_rows FROM '
+                        'information_schema.tables '
+                        'WHERE table_schema = DATABASE()')
+        elif dialect == 'sqlite':
+            # the first number of a stat is the row count of the table
+            stmt = text('SELECT tbl, MAX(CAST(stat AS INTEGER)) '
+                        'FROM sqlite_stat1 GROUP BY tbl')
+        else:
+            return {}
+        try:
+            with self.__engine.connect() as conn:
+                rows = conn.execute(stmt).all()
+        except DBAPIError:
+            # no statistics were gathered yet
+            return {}
+        return {name: int(n) for name, n in rows
+                if name in tables and n is not None}
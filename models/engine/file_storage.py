@@ -1,34 +1,888 @@
 #!/usr/bin/python3
 """This module defines a class to manage file storage for hbnb clone"""
+import atexit
+import bisect
 import json
+import os
+import sys
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+from os import getenv
+from types import MappingProxyType
+from sqlalchemy import event
+from models.engine import bulk, serializers
+from models.engine.query import Query, read_cursor
+
+
+class _BatchState(threading.local):
+    """Batch depth, undo log and staged changes of one thread"""
+    depth = 0
+    undo = None
+    staged = None
 
 
 class FileStorage:
-    """This class manages storage of hbnb models in JSON format"""
+    """This class manages storage of hbnb models in JSON format
+
+    In journal mode (HBNB_FILE_JOURNAL=1) save() appends one record per
+    changed object to a log next to the snapshot instead of rewriting the
+    whole file. Once the log holds as many records as the store holds
+    objects it is folded back into the snapshot.
+
+    Objects are also kept partitioned by class so all(cls) only touches
+    the objects of that class, and indexed by their foreign key columns so
+    related() answers State.cities and friends without a scan.
+
+    close() only reloads when the files on disk changed since they were
+    last read or written, and a reload builds a new object graph before
+    swapping it in.
+
+    The snapshot is read and written one record at a time, in the format
+    matching the extension of file_path (HBNB_FILE_PATH): .json, .jsonl
+    for one record per line or .hbnb for the binary format, see
+    models/engine/serializers.py.
+
+    In lazy mode (HBNB_FILE_LAZY=1) reload() only keeps the raw records
+    and a model is built the first time all(), get() or related() hands
+    it out.
+
+    HBNB_FILE_SHARDS=class stores each class in its own file next to
+    file_path (file.State.json, ...), HBNB_FILE_SHARDS=<n> spreads keys
+    over n hashed files (file.0.json, ...). save() then only rewrites the
+    shards holding changed objects and reload() decodes large shards in
+    parallel on a process pool.
+
+    Write-behind mode (HBNB_FILE_FLUSH_MS=<n>) turns save() into a cheap
+    mark: a background thread flushes at most every n ms, or as soon as
+    HBNB_FILE_FLUSH_CHANGES saves (default 1000) piled up. flush() writes
+    synchronously, and close() and interpreter exit flush what is left.
+    Files are always replaced atomically (temp file, fsync, rename).
+
+    The serialized form of every object is cached and only rebuilt for
+    objects whose attributes changed since (see BaseModel.clear_changes),
+    so saving a large store with few changes mostly copies cached text.
+
+    Inside `with storage.batch():` save() is deferred to the end of the
+    block, and an exception undoes the new() and delete() calls made in
+    it.
+
+    query() looks objects up by attribute values, see
+    models/engine/query.py. Lookups on id or on an indexed foreign key only
+    visit the matching objects.
+
+    Reads do not lock: all() hands out snapshots that are never changed
+    afterwards. Writers serialize on a lock and copy a map shared with a
+    snapshot before changing it, so a thread iterating all(cls) never sees
+    a half-applied write. `version` grows with every change.
+    """
     __file_path = 'file.json'
-    __objects = {}
+    __compact_min = 1000
+    __parallel_min = 1 << 20
+    __stores = weakref.WeakSet()
+    __foreign_keys = {}
+
+    def __init__(self, file_path=None, journal=None, lazy=None,
+                 shards=None, flush_ms=None, flush_changes=None):
+        """Initialize FileStorage"""
+        if file_path is None:
+            file_path = getenv('HBNB_FILE_PATH')
+        if file_path is not None:
+            self.__file_path = file_path
+        if journal is None:
+            journal = getenv('HBNB_FILE_JOURNAL', '') in ('1', 'true')
+        self.__journal = journal
+        if lazy is None:
+            lazy = getenv('HBNB_FILE_LAZY', '') in ('1', 'true')
+        self.__lazy = lazy
+        if shards is None:
+            shards = getenv('HBNB_FILE_SHARDS') or None
+        if shards is not None and shards != 'class':
+            shards = int(shards) or None
+        self.__shards = shards
+        self.__encode = serializers.for_path(self.__file_path).encode
+        if flush_ms is None:
+            flush_ms = getenv('HBNB_FILE_FLUSH_MS') or None
+        self.__flush_interval = None
+        if flush_ms is not None:
+            self.__flush_interval = float(flush_ms) / 1000
+        if flush_changes is None:
+            flush_changes = getenv('HBNB_FILE_FLUSH_CHANGES') or 1000
+        self.__flush_changes = int(flush_changes)
+        self.__lock = threading.RLock()
+        self.__flushed = threading.Condition(self.__lock)
+        self.__unflushed = 0
+        self.__last_flush = 0
+        self.__retry_at = 0
+        self.__flusher = None
+        self.__objects = {}
+        self.__by_class = {}
+        self.__raw = {}
+        self.__raw_by_class = {}
+        self.__related = {}
+        self.__fk_values = {}
+        self.__records = {}
+        self.__shard_keys = {}
+        self.__local = _BatchState()
+        self.__batches = {}
+        self.__pending = {}
+        self.__logged = 0
+        self.__seen = None
+        self.__version = 0
+        self.__snapshots = {}
+        self.__frozen = set()
+        FileStorage.__stores.add(self)
+
+    @property
+    def journal_path(self):
+        """Path of the append-only log used in journal mode"""
+        return self.__file_path + '.log'
+
+    @property
+    def version(self):
+        """Number of changes made to the stored objects so far"""
+        return self.__version
+
+    def all(self, cls=None, load=None):
+        """Returns a dictionary of models currently in storage
 
-    def all(self, cls=None):
-        """Returns a dictionary of models currently in storage"""
-        if cls is not None:
-            return {k: v for k, v in FileStorage.__objects.items() if isinstance(v, cls)}
-        return FileStorage.__objects
+        The result is a read-only snapshot that later writes leave
+        untouched, of every object or of those of a class (or class name).
+        Objects are removed with delete().
+        load is accepted for DBStorage parity, relationships are index
+        lookups here.
+        """
+        if type(cls) is str:
+            cls = self.classes()[cls]
+        if not self.__raw:
+            snapshot = self.__snapshots.get(cls)
+            if snapshot is not None:
+                return snapshot
+        with self.__lock:
+            if cls is None:
+                for key in list(self.__raw):
+                    self.__materialize(key)
+                self.__frozen.add(None)
+                snapshot = MappingProxyType(self.__objects)
+            else:
+                for c in list(self.__raw_by_class):
+                    if issubclass(c, cls):
+                        for key in list(self.__raw_by_class[c]):
+                            self.__materialize(key)
+                parts = [c for c in self.__by_class
+                         if c is not cls and issubclass(c, cls)]
+                if not parts:
+                    self.__frozen.add(cls)
+                    snapshot = MappingProxyType(
+                        self.__by_class.setdefault(cls, {}))
+                else:
+                    merged = dict(self.__by_class.get(cls, ()))
+                    for c in parts:
+                        merged.update(self.__by_class[c])
+                    snapshot = MappingProxyType(merged)
+            self.__snapshots[cls] = snapshot
+            return snapshot
 
     def new(self, obj):
-        """Adds new object to storage dictionary"""
-        self.all().update({obj.to_dict()['__class__'] + '.' + obj.id: obj})
+        """Adds new object to storage dictionary
+
+        The object is encoded again on the next save(), so changes that
+        bypass setattr, like __dict__ updates, are written too.
+        """
+        key = type(obj).__name__ + '.' + obj.id
+        with self.__lock:
+            self.__records.pop(key, None)
+            self.__remember(key)
+            self.__put(key, obj)
+            self.__stage(key, obj)
+
+    def bulk_insert(self, cls, rows, chunk_size=None):
+        """Stores new cls objects from dicts of attributes, see bulk.py
+
+        Every id must be new. The storage is locked once and saved once,
+        chunk_size is accepted for DBStorage parity. Returns a BulkResult.
+        """
+        return self.__bulk(cls, rows, False)
+
+    def bulk_upsert(self, cls, rows, chunk_size=None):
+        """Like bulk_insert(), but updates the objects already stored"""
+        return self.__bulk(cls, rows, True)
+
+    def __bulk(self, cls, rows, update):
+        """Stores or updates the objects of rows under a single lock"""
+        start = time.perf_counter()
+        if type(cls) is str:
+            cls = self.classes()[cls]
+        staged = [(cls.__name__ + '.' + record['id'], record)
+                  for record in bulk.records(rows)]
+        with self.__lock:
+            if not update:
+                keys = set()
+                for key, record in staged:
+                    if key in keys or key in self.__objects or \
+                            key in self.__raw:
+                        raise ValueError('{} is already stored'.format(key))
+                    keys.add(key)
+            for key, record in staged:
+                obj = self.__object(key) if update else None
+                if obj is None:
+                    obj = cls(**record)
+                    self.__remember(key)
+                    self.__put(key, obj)
+                else:
+                    del record['created_at']
+                    for name, value in record.items():
+                        setattr(obj, name, value)
+                self.__stage(key, obj)
+            self.save()
+        return bulk.result(len(staged), start)
+
+    def get(self, cls, id):
+        """Retrieve one object based on class name and ID"""
+        if cls is None or id is None:
+            return None
+        if type(cls) is not str:
+            cls = cls.__name__
+        return self.__object(cls + '.' + id)
+
+    def count(self, cls=None, approximate=False):
+        """Count the number of objects in storage, always exactly
+
+        Like all(cls), objects of subclasses of cls are counted too.
+        """
+        if cls is None:
+            return len(self.__objects) + len(self.__raw)
+        if type(cls) is str:
+            cls = self.classes()[cls]
+        return sum(len(part) for parts in (self.__by_class,
+                                           self.__raw_by_class)
+                   for c, part in list(parts.items()) if issubclass(c, cls))
+
+    def related(self, cls, attr, id):
+        """Returns the objects of cls whose foreign key attr equals id"""
+        if type(cls) is str:
+            cls = self.classes()[cls]
+        children = self.__related.get((cls, attr), {}).get(id, ())
+        objs = [self.__object(key) for key in list(children)]
+        # a key can be deleted between reading the index and the object
+        return [obj for obj in objs if obj is not None]
+
+    def iter_all(self, cls=None, batch_size=1000, after=None):
+        """Yields the objects of cls (all if None) by class name, then id
+
+        after is a token from query.cursor() to resume past an object.
+        batch_size only matters to the database engine.
+        """
+        if type(cls) is str:
+            cls = self.classes()[cls]
+        start = None if after is None else read_cursor(after)
+        for name, c in sorted(self.classes().items()):
+            if cls is not None and not issubclass(c, cls):
+                continue
+            if start is not None and name < start[0]:
+                continue
+            with self.__lock:
+                keys = list(chain(self.__by_class.get(c, ()),
+                                  self.__raw_by_class.get(c, ())))
+            keys.sort()
+            if start is not None and name == start[0]:
+                keys = keys[bisect.bisect_right(keys, name + '.' +
+                                                start[1]):]
+            for key in keys:
+                obj = self.__object(key)
+                if obj is not None:
+                    yield obj
+
+    def query(self, cls):
+        """Returns a Query over the objects of cls, see engine/query.py"""
+        if type(cls) is str:
+            cls = self.classes()[cls]
+        return Query(cls, self.__select)
+
+    def __select(self, query, count):
+        """Runs query from the id or a foreign key index when it can"""
+        cls, criteria = query.cls, query.criteria
+        if criteria.get('id') is not None:
+            candidates = [self.__object(c.__name__ + '.' + criteria['id'])
+                          for c in self.classes().values()
+                          if issubclass(c, cls)]
+        else:
+            keys = None
+            for attr, value in criteria.items():
+                index = self.__related.get((cls, attr))
+                if index is not None and value is not None:
+                    found = index.get(value, ())
+                    if keys is None or len(found) < len(keys):
+                        keys = found
+            if keys is None:
+                candidates = self.all(cls).values()
+            else:
+                candidates = [self.__object(key) for key in list(keys)]
+        found = [obj for obj in candidates if obj is not None and
+                 all(getattr(obj, attr, None) == value
+                     for attr, value in criteria.items())]
+        if count and not query.first_row and query.max_rows is None:
+            return len(found)
+        found.sort(key=lambda obj: obj.id)
+        for name in reversed(query.ordering):
+            attr = name.lstrip('-')
+            found.sort(key=lambda obj: (getattr(obj, attr, None) is not None,
+                                        getattr(obj, attr, None)),
+                       reverse=name.startswith('-'))
+        found = found[query.first_row:]
+        if query.max_rows is not None:
+            found = found[:query.max_rows]
+        return len(found) if count else found
+
+    def __object(self, key):
+        """Returns the object stored under key, building it if needed"""
+        obj = self.__objects.get(key)
+        if obj is None and key in self.__raw:
+            with self.__lock:
+                obj = self.__objects.get(key)
+                if obj is None and key in self.__raw:
+                    obj = self.__materialize(key)
+        return obj
+
+    def __materialize(self, key):
+        """Builds the model for a raw record and stores it in its place"""
+        cls, record = self.__raw.pop(key)
+        del self.__raw_by_class[cls][key]
+        obj = cls(**record)
+        self.__writable(None)[key] = obj
+        self.__writable(cls)[key] = obj
+        cached = self.__records.get(key)
+        if cached is not None:
+            self.__records[key] = (obj, cached[1])
+        return obj
+
+    def __record(self, key, obj):
+        """Returns the encoded record of obj, rebuilt only if it changed"""
+        cached = self.__records.get(key)
+        if (cached is not None and cached[0] is obj and
+                not obj.changed_attributes()):
+            return cached[1]
+        record = self.__encode(obj.to_dict())
+        obj.clear_changes()
+        self.__records[key] = (obj, record)
+        return record
+
+    def __raw_record(self, key, record):
+        """Returns the encoded form of a record that was never built"""
+        cached = self.__records.get(key)
+        if cached is not None and cached[0] is None:
+            return cached[1]
+        record = self.__encode(record)
+        self.__records[key] = (None, record)
+        return record
+
+    def __put(self, key, obj):
+        """Stores obj under key in the flat map, partition and indexes"""
+        old = self.__objects.get(key)
+        if old is not None and type(old) is type(obj):
+            self.__unindex(key, type(old))
+        else:
+            self.__drop(key)
+        self.__writable(None)[key] = obj
+        self.__writable(type(obj))[key] = obj
+        self.__index(key, type(obj), lambda attr: getattr(obj, attr, None))
+        self.__track(key)
+
+    def __put_raw(self, key, cls, record):
+        """Stores a record to be built into a cls instance on first use"""
+        self.__drop(key)
+        self.__invalidate(cls)
+        self.__raw[key] = (cls, record)
+        self.__raw_by_class.setdefault(cls, {})[key] = record
+        self.__index(key, cls, record.get)
+        self.__track(key)
+
+    def __drop(self, key):
+        """Removes key from the maps and indexes, True if it was there"""
+        obj = self.__objects.get(key)
+        if obj is not None:
+            cls = type(obj)
+            del self.__writable(None)[key]
+            self.__writable(cls).pop(key, None)
+        elif key in self.__raw:
+            cls = self.__raw.pop(key)[0]
+            del self.__raw_by_class[cls][key]
+        else:
+            return False
+        self.__unindex(key, cls)
+        self.__records.pop(key, None)
+        if self.__shards and self.__shards != 'class':
+            self.__shard_keys.get(self.__shard_of(key), {}).pop(key, None)
+        return True
+
+    def __track(self, key):
+        """Records which hashed shard key lives in"""
+        if self.__shards and self.__shards != 'class':
+            self.__shard_keys.setdefault(self.__shard_of(key), {})[key] = None
+
+    def __writable(self, cls):
+        """Returns the map of cls (None for all objects) ready to change
+
+        A map handed out by all() is copied first so the snapshot keeps
+        its content.
+        """
+        self.__invalidate(cls)
+        if cls is None:
+            if None in self.__frozen:
+                self.__objects = dict(self.__objects)
+                self.__frozen.discard(None)
+            return self.__objects
+        part = self.__by_class.get(cls)
+        if part is None:
+            part = self.__by_class[cls] = {}
+        elif cls in self.__frozen:
+            part = self.__by_class[cls] = dict(part)
+            self.__frozen.discard(cls)
+        return part
+
+    def __invalidate(self, cls):
+        """Forgets the snapshots holding objects of cls, None for all()"""
+        self.__version += 1
+        if cls is None:
+            self.__snapshots.pop(None, None)
+            return
+        for c in [c for c in self.__snapshots
+                  if c is not None and issubclass(cls, c)]:
+            self.__snapshots.pop(c, None)
+
+    def __index(self, key, cls, lookup):
+        """Adds key to the reverse index of each foreign key of cls"""
+        values = {}
+        for attr in self.__foreign_keys_of(cls):
+            value = lookup(attr)
+            values[attr] = value
+            self.__link(cls, attr, value, key)
+        if values:
+            self.__fk_values[key] = values
+
+    def __unindex(self, key, cls):
+        """Removes key from the reverse indexes it was recorded in"""
+        for attr, value in self.__fk_values.pop(key, {}).items():
+            self.__unlink(cls, attr, value, key)
+
+    def __link(self, cls, attr, value, key):
+        """Records key under value in the cls.attr reverse index"""
+        if value is not None:
+            index = self.__related.setdefault((cls, attr), {})
+            index.setdefault(value, {})[key] = None
+
+    def __unlink(self, cls, attr, value, key):
+        """Forgets key under value in the cls.attr reverse index"""
+        index = self.__related.get((cls, attr), {})
+        children = index.get(value)
+        if children is not None:
+            children.pop(key, None)
+            if not children:
+                del index[value]
+
+    def __relink(self, obj, attr, value):
+        """Moves obj to a new parent after its foreign key was assigned"""
+        key = type(obj).__name__ + '.' + str(obj.id)
+        with self.__lock:
+            if self.__objects.get(key) is not obj:
+                return
+            values = self.__fk_values.setdefault(key, {})
+            self.__unlink(type(obj), attr, values.get(attr), key)
+            values[attr] = value
+            self.__link(type(obj), attr, value, key)
+
+    @staticmethod
+    def __foreign_keys_of(cls):
+        """Returns the foreign key columns of cls, watching them for sets"""
+        try:
+            return FileStorage.__foreign_keys[cls]
+        except KeyError:
+            pass
+        table = getattr(cls, '__table__', None)
+        columns = ()
+        if table is not None:
+            columns = tuple(c.name for c in table.columns if c.foreign_keys)
+        for attr in columns:
+            event.listen(getattr(cls, attr), 'set',
+                         FileStorage.__foreign_key_set)
+        FileStorage.__foreign_keys[cls] = columns
+        return columns
+
+    @staticmethod
+    def __foreign_key_set(target, value, oldvalue, initiator):
+        """Keeps reverse indexes current when a foreign key is assigned"""
+        for store in list(FileStorage.__stores):
+            store.__relink(target, initiator.key, value)
+
+    @contextmanager
+    def batch(self):
+        """Defers save() to the end of the block, undone on an exception
+
+        Batches belong to the thread running them, nested ones join the
+        outermost one. Until it ends the files keep what the keys it
+        touched held before. Attribute changes made in place on objects
+        that were already stored are not undone.
+        """
+        local = self.__local
+        with self.__lock:
+            if not local.depth:
+                local.undo, local.staged = {}, {}
+                self.__batches[threading.get_ident()] = (local.undo,
+                                                         local.staged)
+            local.depth += 1
+        try:
+            yield self
+        except BaseException:
+            with self.__lock:
+                local.depth -= 1
+                if not local.depth:
+                    del self.__batches[threading.get_ident()]
+                    self.__rollback(local.undo)
+                    local.undo = local.staged = None
+            raise
+        with self.__lock:
+            local.depth -= 1
+            if local.depth:
+                return
+            del self.__batches[threading.get_ident()]
+            self.__pending.update(local.staged)
+            local.undo = local.staged = None
+        self.save()
+
+    def __stage(self, key, obj):
+        """Marks key changed, in the batch of this thread if one runs"""
+        local = self.__local
+        if local.depth:
+            local.staged[key] = obj
+        else:
+            self.__pending[key] = obj
+
+    def __remember(self, key):
+        """Records what key held before the running batch touched it"""
+        undo = self.__local.undo
+        if undo is None or key in undo:
+            return
+        previous = self.__objects.get(key)
+        if previous is None:
+            previous = self.__raw.get(key)
+        undo[key] = previous
+
+    def __rollback(self, undo):
+        """Restores every key a batch touched"""
+        for key, value in undo.items():
+            if value is None:
+                self.__drop(key)
+            elif type(value) is tuple:
+                self.__put_raw(key, *value)
+            else:
+                self.__put(key, value)
 
     def save(self):
-        """Saves storage dictionary to file"""
-        with open(FileStorage.__file_path, 'w') as f:
-            temp = {}
-            temp.update(FileStorage.__objects)
-            for key, val in temp.items():
-                temp[key] = val.to_dict()
-            json.dump(temp, f)
+        """Saves storage dictionary to file
+
+        In write-behind mode this only wakes up the background flusher,
+        inside a batch it does nothing until the batch ends.
+        """
+        if self.__local.depth:
+            return
+        if self.__flush_interval is None:
+            self.flush()
+            return
+        with self.__lock:
+            self.__unflushed += 1
+            if self.__flusher is None:
+                self.__flusher = threading.Thread(
+                    target=self.__flush_loop, args=(weakref.ref(self),),
+                    name='FileStorage flusher', daemon=True)
+                self.__flusher.start()
+            self.__flushed.notify_all()
+
+    def flush(self):
+        """Writes every change saved so far to disk"""
+        with self.__lock:
+            self.__flush()
+            self.__unflushed = 0
+            self.__last_flush = time.monotonic()
+
+    def __flush(self):
+        """Persists pending changes as a snapshot or journal records"""
+        if not self.__journal:
+            shards = None
+            if self.__shards:
+                shards = {self.__shard_of(key) for key in self.__pending}
+                shards.update(name for name, path
+                              in self.__shard_paths().items()
+                              if not os.path.exists(path))
+            self.__write_snapshot(shards)
+            self.__pending.clear()
+            self.__seen = self.__stamp()
+            return
+        if self.__pending:
+            with open(self.journal_path, 'a') as f:
+                for key, obj in self.__pending.items():
+                    value = 'null'
+                    if obj is not None:
+                        value = self.__record(key, obj)
+                        if type(value) is not str:
+                            value = json.dumps(value)
+                    f.write('{"k": ' + json.dumps(key) + ', "v": ' +
+                            value + '}\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.__logged += len(self.__pending)
+            self.__pending.clear()
+        if self.__logged >= max(self.__compact_min, self.count()):
+            self.compact()
+        self.__seen = self.__stamp()
+
+    def compact(self):
+        """Folds the journal into a fresh snapshot and truncates it"""
+        with self.__lock:
+            self.__write_snapshot()
+            self.__pending.clear()
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self.__logged = 0
+            self.__seen = self.__stamp()
+
+    @staticmethod
+    def __flush_loop(ref):
+        """Background thread body flushing a write-behind storage
+
+        Only a weak reference is kept between rounds so an unused storage
+        can still be garbage collected.
+        """
+        while True:
+            self = ref()
+            if self is None or sys.is_finalizing():
+                return
+            with self.__lock:
+                if not self.__unflushed:
+                    self.__flushed.wait(1)
+                else:
+                    while True:
+                        now = time.monotonic()
+                        if now < self.__retry_at:
+                            due = self.__retry_at
+                        elif self.__unflushed >= self.__flush_changes:
+                            break
+                        else:
+                            due = self.__last_flush + self.__flush_interval
+                            if due <= now:
+                                break
+                        self.__flushed.wait(due - now)
+                    try:
+                        if self.__unflushed:
+                            self.flush()
+                    except Exception:
+                        # keep the changes pending, flush() or close()
+                        # retry and raise in the caller's thread, this
+                        # thread tries again one interval later
+                        self.__retry_at = (time.monotonic() +
+                                           self.__flush_interval)
+            del self
+
+    @staticmethod
+    def __flush_all():
+        """Flushes every write-behind storage before the interpreter exits"""
+        for store in list(FileStorage.__stores):
+            if store.__unflushed:
+                store.flush()
+
+    def __write_snapshot(self, shards=None):
+        """Writes the given shards, or every shard, to the snapshot files
+
+        Only the objects stored in the shards written are visited.
+        """
+        paths = self.__shard_paths()
+        hidden = {}
+        for undo, staged in self.__batches.values():
+            for key, previous in undo.items():
+                hidden.setdefault(key, previous)
+        if not self.__shards:
+            keys = chain(self.__objects, self.__raw)
+            self.__write_file(paths[None], self.__items(keys, hidden))
+            return
+        if shards is None:
+            shards = set(paths)
+        for name in shards:
+            mine = {key: previous for key, previous in hidden.items()
+                    if self.__shard_of(key) == name}
+            self.__write_file(paths[name],
+                              self.__items(self.__keys_in(name), mine))
+
+    def __keys_in(self, shard):
+        """Returns the keys stored in the shard named shard"""
+        if self.__shards == 'class':
+            cls = self.classes()[shard]
+            return list(chain(self.__by_class.get(cls, ()),
+                              self.__raw_by_class.get(cls, ())))
+        return list(self.__shard_keys.get(shard, ()))
+
+    def __items(self, keys, hidden):
+        """Yields each key with the encoded record stored under it
+
+        The keys of hidden yield the value they held before a batch of
+        another thread changed them instead, None when they were absent.
+        """
+        for key in keys:
+            if key in hidden:
+                continue
+            obj = self.__objects.get(key)
+            if obj is not None:
+                yield key, self.__record(key, obj)
+            else:
+                yield key, self.__raw_record(key, self.__raw[key][1])
+        for key, previous in hidden.items():
+            if type(previous) is tuple:
+                yield key, self.__encode(previous[1])
+            elif previous is not None:
+                yield key, self.__encode(previous.to_dict())
+
+    @staticmethod
+    def __write_file(path, items):
+        """Atomically replaces the file at path with the given records"""
+        serializer = serializers.for_path(path)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb' if serializer.binary else 'w') as f:
+            serializer.write(f, items)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def __shard_paths(self):
+        """Returns the snapshot file of each shard, keyed by shard name"""
+        if not self.__shards:
+            return {None: self.__file_path}
+        if self.__shards == 'class':
+            names = list(self.classes())
+        else:
+            names = [str(i) for i in range(self.__shards)]
+        root, ext = os.path.splitext(self.__file_path)
+        return {name: '{}.{}{}'.format(root, name, ext) for name in names}
+
+    def __shard_of(self, key):
+        """Returns the name of the shard key is stored in"""
+        if self.__shards == 'class':
+            return key.split('.', 1)[0]
+        return str(zlib.crc32(key.encode()) % self.__shards)
 
     def reload(self):
-        """Loads storage dictionary from file"""
+        """Loads storage dictionary from file
+
+        Objects added or deleted since the last save() are carried over
+        onto the freshly loaded objects.
+        """
+        seen = self.__stamp()
+        fresh = FileStorage(self.__file_path, self.__journal, self.__lazy,
+                            self.__shards)
+        FileStorage.__stores.discard(fresh)
+        fresh.__load()
+        with self.__lock:
+            staged = (batch[1].items() for batch in self.__batches.values())
+            for key, obj in chain(self.__pending.items(), *staged):
+                if obj is None:
+                    fresh.__drop(key)
+                else:
+                    fresh.__put(key, obj)
+            (self.__objects, self.__by_class, self.__raw,
+             self.__raw_by_class, self.__related, self.__fk_values,
+             self.__records, self.__shard_keys, self.__logged, self.__seen,
+             self.__snapshots, self.__frozen) = (
+                fresh.__objects, fresh.__by_class, fresh.__raw,
+                fresh.__raw_by_class, fresh.__related, fresh.__fk_values,
+                fresh.__records, fresh.__shard_keys, fresh.__logged, seen,
+                {}, set())
+            self.__version += 1
+
+    def __stamp(self):
+        """Returns the identity, size and mtime of the backing files"""
+        paths = list(self.__shard_paths().values())
+        if self.__journal:
+            paths.append(self.journal_path)
+        stamp = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+                continue
+            stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        return tuple(stamp)
+
+    def __load(self):
+        """Fills this storage from the snapshot and journal on disk"""
+        classes = self.classes()
+        if self.__shards:
+            for items in self.__read_shards():
+                for key, val in items:
+                    self.__load_record(key, classes[val['__class__']], val)
+        else:
+            serializer = serializers.for_path(self.__file_path)
+            try:
+                with serializers.open_file(self.__file_path, 'r') as f:
+                    for key, val in serializer.read(f):
+                        self.__load_record(key, classes[val['__class__']],
+                                           val)
+            except FileNotFoundError:
+                pass
+        if self.__journal:
+            self.__replay(classes)
+
+    def __read_shards(self):
+        """Returns the decoded records of every shard file, one list each
+
+        Shards are decoded on a process pool when there is more than one
+        file and enough data to pay for starting it.
+        """
+        paths = [path for path in self.__shard_paths().values()
+                 if os.path.exists(path)]
+        size = sum(os.path.getsize(path) for path in paths)
+        if len(paths) < 2 or size < self.__parallel_min:
+            return map(serializers.read_file, paths)
+        workers = min(len(paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(serializers.read_file, paths))
+
+    def __load_record(self, key, cls, record):
+        """Stores a record read from disk, built now unless lazy"""
+        if self.__lazy:
+            self.__put_raw(key, cls, record)
+        else:
+            self.__put(key, cls(**record))
+
+    def __replay(self, classes):
+        """Applies the journal on top of the loaded snapshot"""
+        self.__logged = 0
+        good = 0
+        try:
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn write at the tail of the log, drop it so
+                        # the next append starts on a clean line
+                        os.truncate(self.journal_path, good)
+                        break
+                    good += len(line)
+                    key, val = record['k'], record['v']
+                    if val is None:
+                        self.__drop(key)
+                    else:
+                        self.__load_record(key, classes[val['__class__']],
+                                           val)
+                    self.__logged += 1
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def classes():
+        """Returns the mapping of class names to model classes"""
         from models.base_model import BaseModel
         from models.user import User
         from models.place import Place
@@ -37,27 +891,27 @@ class FileStorage:
         from models.amenity import Amenity
         from models.review import Review
 
-        classes = {
-                    'BaseModel': BaseModel, 'User': User, 'Place': Place,
-                    'State': State, 'City': City, 'Amenity': Amenity,
-                    'Review': Review
-                  }
-        try:
-            temp = {}
-            with open(FileStorage.__file_path, 'r') as f:
-                temp = json.load(f)
-                for key, val in temp.items():
-                        self.all()[key] = classes[val['__class__']](**val)
-        except FileNotFoundError:
-            pass
+        return {
+                'BaseModel': BaseModel, 'User': User, 'Place': Place,
+                'State': State, 'City': City, 'Amenity': Amenity,
+                'Review': Review
+               }
 
     def delete(self, obj=None):
         """Delete obj from __objects if it's inside"""
         if obj is not None:
             key = obj.__class__.__name__ + "." + obj.id
-            if key in self.__objects:
-                del self.__objects[key]
+            with self.__lock:
+                self.__remember(key)
+                if self.__drop(key):
+                    self.__stage(key, None)
 
     def close(self):
-        """Call reload() method for deserializing the JSON file to objects"""
-        self.reload()
+        """Flush saved changes, then reload() if the files changed"""
+        if self.__unflushed:
+            self.flush()
+        if self.__stamp() != self.__seen:
+            self.reload()
+
+
+atexit.register(FileStorage._FileStorage__flush_all)
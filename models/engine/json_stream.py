@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+"""This module reads storage files one record at a time
+
+iter_items() walks the top-level object of a file.json style document
+and iter_lines() reads the line-delimited layout, one record per line.
+Both keep roughly one chunk plus one record in memory.
+"""
+import json
+import re
+
+_BLANK = re.compile(r'\s*')
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffers a text file and decodes JSON values from it"""
+
+    def __init__(self, f, chunk_size):
+        """Initialize the reader on an open text file"""
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Appends the next chunk to the unread part of the buffer"""
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def peek(self):
+        """Returns the next non-blank character, '' at end of file"""
+        while True:
+            self.pos = _BLANK.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self.more()
+
+    def expect(self, char):
+        """Consumes char or raises JSONDecodeError"""
+        if self.peek() != char:
+            raise json.JSONDecodeError('Expecting ' + repr(char),
+                                       self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next JSON value, reading more input as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # a value ending at the buffer edge may continue past it
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.more()
+
+
+def iter_items(f, chunk_size=1 << 16):
+    """Yields the key, value pairs of the JSON object in f one by one"""
+    reader = _Reader(f, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        if type(key) is not str:
+            raise json.JSONDecodeError('Expecting property name',
+                                       reader.buf, reader.pos)
+        reader.expect(':')
+        yield key, reader.value()
+        if reader.peek() != ',':
+            reader.expect('}')
+            return
+        reader.pos += 1
+
+
+def iter_lines(f):
+    """Yields the key, record pairs of a line-delimited storage file"""
+    for line in f:
+        if line.strip():
+            record = json.loads(line)
+            yield record['__class__'] + '.' + record['id'], record
+
+
+def write_items(f, items):
+    """Writes key, record pairs as one JSON object, record by record
+
+    A record given as a str is taken to be already JSON encoded.
+    """
+    f.write('{')
+    sep = ''
+    for key, record in items:
+        if type(record) is not str:
+            record = json.dumps(record)
+        f.write(sep + json.dumps(key) + ': ' + record)
+        sep = ', '
+    f.write('}')
+
+
+def write_lines(f, items):
+    """Writes key, record pairs in the line-delimited layout
+
+    A record given as a str is taken to be already JSON encoded.
+    """
+    for key, record in items:
+        if type(record) is not str:
+            record = json.dumps(record)
+        f.write(record + '\n')
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+"""This module holds the versioned schema migrations of the database engines
+
+create_all() only creates missing tables, so a database built by an
+older release never gets the indexes or columns added to the models
+since. Each migration below changes a live database on a connection and
+is registered under a version number with @migration(version).
+migrate() runs the ones newer than the highest version recorded in the
+schema_version table, in order and each in its own transaction. Steps
+skip what already exists, so they are harmless on a database that
+create_all() built from the current models, or on one that another
+process is migrating at the same time.
+"""
+from datetime import datetime
+from sqlalchemy import (Column, DateTime, Integer, MetaData, Table, func,
+                        inspect, select, text)
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+metadata = MetaData()
+schema_version = Table('schema_version', metadata,
+                       Column('version', Integer, primary_key=True),
+                       Column('applied_at', DateTime, nullable=False))
+migrations = {}
+
+
+def migration(version):
+    """Registers the decorated function as the migration to version"""
+    def register(func):
+        migrations[version] = func
+        return func
+    return register
+
+
+def version(conn):
+    """Returns the schema version of the database on conn, 0 when new"""
+    metadata.create_all(conn)
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() \
+        or 0
+
+
+def migrate(engine, target=None):
+    """Runs the pending migrations up to target, all by default
+
+    Returns the list of versions applied. The pool is recycled after a
+    change, as drivers like sqlite3 keep statements prepared against the
+    old schema, EXPLAIN ones included, unless that would drop the
+    database, see recyclable().
+    """
+    current = current_version(engine)
+    applied = []
+    for number in sorted(migrations):
+        if number <= current or target is not None and number > target:
+            continue
+        try:
+            with engine.begin() as conn:
+                migrations[number](conn)
+                conn.execute(schema_version.insert().values(
+                    version=number, applied_at=datetime.utcnow()))
+        except DBAPIError:
+            # a process starting alongside may have applied it first
+            if current_version(engine) < number:
+                raise
+            continue
+        applied.append(number)
+    if applied and recyclable(engine):
+        engine.dispose()
+    return applied
+
+
+def current_version(engine):
+    """Returns the schema version of the database engine connects to
+
+    Another process creating the schema_version table at the same time
+    makes the first attempt fail, so it is tried twice.
+    """
+    try:
+        with engine.begin() as conn:
+            return version(conn)
+    except DBAPIError:
+        with engine.begin() as conn:
+            return version(conn)
+
+
+def recyclable(engine):
+    """Returns True when the connections of engine can be replaced
+
+    An in-memory SQLite database lives as long as its connection, and
+    SingletonThreadPool and StaticPool keep one connection for good.
+    """
+    if isinstance(engine.pool, (SingletonThreadPool, StaticPool)):
+        return False
+    return not (engine.dialect.name == 'sqlite' and
+                engine.url.database in (None, '', ':memory:'))
+
+
+def add_index(conn, table, *columns, unique=False):
+    """Indexes columns of table unless an index already leads with them
+
+    Returns True when the index was created.
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return False
+    columns = list(columns)
+    leading = [index['column_names'][:len(columns)]
+               for index in inspector.get_indexes(table)]
+    leading.append(inspector.get_pk_constraint(table)
+                   ['constrained_columns'][:len(columns)])
+    if columns in leading:
+        return False
+    quote = conn.dialect.identifier_preparer.quote
+    conn.execute(text('CREATE {}INDEX {} ON {} ({})'.format(
+        'UNIQUE ' if unique else '',
+        quote('ix_{}_{}'.format(table, '_'.join(columns))), quote(table),
+        ', '.join(quote(column) for column in columns))))
+    return True
+
+
+def add_column(conn, table, column):
+    """Adds the Column column to table unless it has one by that name
+
+    Returns True when the column was added. A NOT NULL column needs a
+    server_default to fill the rows already there.
+    """
+    inspector = inspect(conn)
+    if column.name in [c['name'] for c in inspector.get_columns(table)]:
+        return False
+    quote = conn.dialect.identifier_preparer.quote
+    ddl = 'ALTER TABLE {} ADD COLUMN {} {}'.format(
+        quote(table), quote(column.name),
+        column.type.compile(dialect=conn.dialect))
+    if column.server_default is not None:
+        ddl += " DEFAULT '{}'".format(column.server_default.arg)
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    conn.execute(text(ddl))
+    return True
+
+
+def explain(engine, statement):
+    """Returns the lines of the plan the database picks for statement"""
+    compiled = statement.compile(dialect=engine.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    sqlite = engine.dialect.name == 'sqlite'
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            ('EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN ') + str(compiled),
+            params)
+        if sqlite:
+            return [row[-1] for row in rows]
+        return [', '.join('{}={}'.format(name, value)
+                          for name, value in row._mapping.items())
+                for row in rows]
+
+
+@migration(1)
+def index_lookups(conn):
+    """Indexes the foreign keys and the columns objects are looked up by"""
+    for table, column in (('cities', 'state_id'), ('places', 'city_id'),
+                          ('places', 'user_id'), ('reviews', 'place_id'),
+                          ('reviews', 'user_id'),
+                          ('place_amenity', 'amenity_id'),
+                          ('users', 'email'), ('states', 'name')):
+        add_index(conn, table, column)
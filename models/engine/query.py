@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""This module defines the query object shared by the storage engines"""
+import base64
+
+
+class Query:
+    """Describes a lookup of model objects, run by the storage engine
+
+        storage.query(City).filter(state_id=id).order_by('name').limit(5)
+
+    Every method returns a new query, so a query can be refined without
+    changing the one it came from. filter() matches attributes by
+    equality, order_by() takes attribute names, '-name' sorting in
+    descending order with missing values first when ascending. Objects
+    tying on every ordering attribute come by id, so limit() and
+    offset() page the same way on every engine. load() names
+    relationships a database engine fetches along with the objects.
+    """
+
+    def __init__(self, cls, run):
+        """Initialize a query for cls, executed by run(query, count)"""
+        self.cls = cls
+        self.criteria = {}
+        self.ordering = ()
+        self.first_row = 0
+        self.max_rows = None
+        self.loads = ()
+        self.__run = run
+
+    def __copy(self, **changes):
+        """Returns a copy of this query with some attributes replaced"""
+        query = Query(self.cls, self.__run)
+        query.criteria = self.criteria
+        query.ordering = self.ordering
+        query.first_row = self.first_row
+        query.max_rows = self.max_rows
+        query.loads = self.loads
+        for name, value in changes.items():
+            setattr(query, name, value)
+        return query
+
+    def filter(self, **criteria):
+        """Returns the query narrowed to objects matching every criterion"""
+        return self.__copy(criteria=dict(self.criteria, **criteria))
+
+    def order_by(self, *names):
+        """Returns the query sorted by names after its current ordering"""
+        return self.__copy(ordering=self.ordering + names)
+
+    def load(self, *paths):
+        """Returns the query also loading relationships like 'cities'"""
+        return self.__copy(loads=self.loads + paths)
+
+    def limit(self, n):
+        """Returns the query cut to at most n objects"""
+        return self.__copy(max_rows=n)
+
+    def offset(self, k):
+        """Returns the query skipping its first k objects"""
+        return self.__copy(first_row=k)
+
+    def all(self):
+        """Returns the list of matching objects"""
+        return self.__run(self, False)
+
+    def first(self):
+        """Returns the first matching object, None if there is none"""
+        found = self.limit(1).all()
+        return found[0] if found else None
+
+    def count(self):
+        """Returns the number of matching objects"""
+        return self.__run(self, True)
+
+    def __iter__(self):
+        """Iterates over the matching objects"""
+        return iter(self.all())
+
+
+def cursor(obj):
+    """Returns a token that makes iter_all() resume after obj"""
+    key = type(obj).__name__ + '.' + obj.id
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def read_cursor(token):
+    """Returns the class name and id a cursor token points after"""
+    try:
+        key = base64.urlsafe_b64decode(token.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor {!r}'.format(token)) from None
+    name, sep, id = key.partition('.')
+    if not sep:
+        raise ValueError('Invalid cursor {!r}'.format(token))
+    return name, id
@@ -0,0 +1,395 @@
+#!/usr/bin/python3
+"""This module defines the snapshot formats FileStorage can use
+
+The format of a storage file is picked from its extension:
+    .json   one JSON object keyed by <class>.<id> (the historic file.json)
+    .jsonl  one JSON record per line
+    .hbnb   compact binary snapshot, see BinarySerializer
+Other formats can be plugged in by adding an instance to `serializers`.
+"""
+import json
+import os
+import struct
+import uuid
+from datetime import datetime, timedelta
+from models.engine import json_stream
+
+
+class JSONSerializer:
+    """Reads and writes the file.json layout
+
+    encode() turns a record into the form write() accepts in its place,
+    so callers can cache it for records that did not change.
+    """
+    binary = False
+
+    def encode(self, record):
+        """Returns record as JSON text"""
+        return json.dumps(record)
+
+    def read(self, f):
+        """Yields the key, record pairs stored in f"""
+        return json_stream.iter_items(f)
+
+    def write(self, f, items):
+        """Writes key, record pairs to f"""
+        json_stream.write_items(f, items)
+
+
+class LinesSerializer(JSONSerializer):
+    """Reads and writes one JSON record per line"""
+
+    def read(self, f):
+        """Yields the key, record pairs stored in f"""
+        return json_stream.iter_lines(f)
+
+    def write(self, f, items):
+        """Writes key, record pairs to f"""
+        json_stream.write_lines(f, items)
+
+
+class BinarySerializer:
+    """Reads and writes the compact binary snapshot format
+
+    A file starts with b'HBNB' and a little-endian u16 format version.
+    Version 2 then holds a sequence of tagged entries, each framed by its
+    length:
+        C <u16 len> <name>   defines the next class name index
+        A <u16 len> <name>   defines the next attribute name index
+        S <u16 len> <shape>  defines the next shape index
+        O <u32 len> <object> one record
+    A shape is a class index, flags and the (name index, type) of every
+    other attribute. Objects of one shape share a precompiled struct for
+    their fixed size part: the id as 16 raw UUID bytes, numbers and
+    string lengths. The string bytes follow, so an object decodes with
+    one unpack and a slice per string. Ids that are not canonical UUIDs
+    are stored as ordinary attributes instead and flagged as such.
+    Timestamps stay isoformat strings, turning microseconds back into
+    them costs more than parsing JSON.
+
+    Version 1 files, which tagged every value of every object and
+    packed the timestamps, are still read.
+    """
+    binary = True
+    magic = b'HBNB'
+    version = 2
+
+    __header = struct.Struct('<4sH')
+    __object = struct.Struct('<HB16sqqH')
+    __field = struct.Struct('<Hc')
+    __shape = struct.Struct('<HBH')
+    __u16 = struct.Struct('<H')
+    __u32 = struct.Struct('<I')
+    __i64 = struct.Struct('<q')
+    __f64 = struct.Struct('<d')
+    __uuid_id = 1
+    __packed_times = 2
+    __epoch = datetime(1970, 1, 1)
+    __micro = timedelta(microseconds=1)
+    __codes = {b's': 'I', b'j': 'I', b'i': 'q', b'f': 'd'}
+    __constants = {b'n': None, b'T': True, b'F': False}
+    __chunk = 1 << 20
+
+    def encode(self, record):
+        """Returns record unchanged, objects are packed by write()"""
+        return record
+
+    def read(self, f):
+        """Yields the key, record pairs stored in f"""
+        magic, version = self.__header.unpack(self.__read(f, 6))
+        if magic != self.magic:
+            raise ValueError('Not an HBNB binary snapshot')
+        if version == 1:
+            return self.__read_v1(f)
+        if version != self.version:
+            raise ValueError('Unsupported snapshot version {}'.format(version))
+        return self.__read_v2(f)
+
+    def write(self, f, items):
+        """Writes key, record pairs to f"""
+        f.write(self.__header.pack(self.magic, self.version))
+        classes, names, shapes = {}, {}, {}
+        for key, record in items:
+            flags, values, layout, strings = 0, [], [], []
+            uid = self.__pack_uuid(record['id'])
+            if uid is not None:
+                flags = self.__uuid_id
+                values.append(uid)
+            for name, value in record.items():
+                if name == '__class__' or name == 'id' and flags:
+                    continue
+                if value is None:
+                    kind = b'n'
+                elif value is True or value is False:
+                    kind = b'T' if value else b'F'
+                elif type(value) is str:
+                    kind, data = b's', value.encode()
+                elif type(value) is int and -(1 << 63) <= value < (1 << 63):
+                    kind = b'i'
+                    values.append(value)
+                elif type(value) is float:
+                    kind = b'f'
+                    values.append(value)
+                else:
+                    kind, data = b'j', json.dumps(value).encode()
+                if kind == b's' or kind == b'j':
+                    values.append(len(data))
+                    strings.append(data)
+                layout.append((name, kind))
+            shape = (record['__class__'], flags, tuple(layout))
+            entry = shapes.get(shape)
+            if entry is None:
+                entry = shapes[shape] = self.__write_shape(
+                    f, shape, len(shapes), classes, names)
+            body = entry[0] + entry[1].pack(*values) + b''.join(strings)
+            f.write(b'O' + self.__u32.pack(len(body)) + body)
+
+    def __write_shape(self, f, shape, index, classes, names):
+        """Defines shape and the names it uses in f
+
+        Returns the packed shape index and the struct of its objects.
+        """
+        cls, flags, layout = shape
+        if cls not in classes:
+            classes[cls] = len(classes)
+            self.__write_entry(f, b'C', cls.encode())
+        body = [self.__shape.pack(classes[cls], flags, len(layout))]
+        fmt = '<16s' if flags & self.__uuid_id else '<'
+        for name, kind in layout:
+            if name not in names:
+                names[name] = len(names)
+                self.__write_entry(f, b'A', name.encode())
+            body.append(self.__field.pack(names[name], kind))
+            fmt += self.__codes.get(kind, '')
+        self.__write_entry(f, b'S', b''.join(body))
+        return self.__u16.pack(index), struct.Struct(fmt)
+
+    def __read_shape(self, body, classes, names):
+        """Decodes a shape definition into what __unpack() needs"""
+        cls, flags, count = self.__shape.unpack_from(body)
+        fmt, slot, fields = '<', 0, []
+        if flags & self.__uuid_id:
+            fmt, slot = '<16s', 1
+        for i in range(count):
+            name, kind = self.__field.unpack_from(
+                body, self.__shape.size + i * self.__field.size)
+            if kind in self.__constants:
+                fields.append((names[name], 0, self.__constants[kind]))
+                continue
+            fmt += self.__codes[kind]
+            fields.append((names[name], {b'i': 1, b'f': 1, b's': 2,
+                                         b'j': 3}[kind], slot))
+            slot += 1
+        return classes[cls], flags, struct.Struct(fmt), fields
+
+    def __read_v2(self, f):
+        """Yields the records of a version 2 file, read in chunks"""
+        classes, names, shapes = [], [], []
+        data, pos = b'', 0
+        while True:
+            chunk = f.read(self.__chunk)
+            if not chunk:
+                if pos < len(data):
+                    raise ValueError('Truncated snapshot')
+                return
+            data, pos = data[pos:] + chunk, 0
+            end = len(data)
+            while pos < end:
+                tag = data[pos:pos + 1]
+                if tag == b'O':
+                    if pos + 5 > end:
+                        break
+                    start = pos + 5
+                    stop = start + self.__u32.unpack_from(data, pos + 1)[0]
+                    if stop > end:
+                        break
+                    record = self.__unpack(data, start, stop, shapes)
+                    yield record['__class__'] + '.' + record['id'], record
+                    pos = stop
+                    continue
+                if tag not in (b'C', b'A', b'S'):
+                    raise ValueError('Corrupt snapshot entry {!r}'.format(tag))
+                if pos + 3 > end:
+                    break
+                start = pos + 3
+                stop = start + self.__u16.unpack_from(data, pos + 1)[0]
+                if stop > end:
+                    break
+                body = data[start:stop]
+                try:
+                    if tag == b'S':
+                        shapes.append(self.__read_shape(body, classes, names))
+                    else:
+                        (classes if tag == b'C' else names).append(
+                            body.decode())
+                except (struct.error, IndexError, KeyError,
+                        UnicodeDecodeError) as e:
+                    raise ValueError('Corrupt snapshot entry') from e
+                pos = stop
+
+    def __unpack(self, data, pos, end, shapes):
+        """Decodes the object stored in data[pos:end]"""
+        try:
+            cls, flags, layout, fields = \
+                shapes[self.__u16.unpack_from(data, pos)[0]]
+            values = layout.unpack_from(data, pos + 2)
+            pos += 2 + layout.size
+            record = {'__class__': cls}
+            if flags:
+                h = values[0].hex()
+                record['id'] = '%s-%s-%s-%s-%s' % (
+                    h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+            for name, kind, slot in fields:
+                if kind == 1:
+                    record[name] = values[slot]
+                elif kind == 0:
+                    record[name] = slot
+                else:
+                    size = values[slot]
+                    value = data[pos:pos + size].decode()
+                    record[name] = value if kind == 2 else json.loads(value)
+                    pos += size
+        except (struct.error, IndexError, UnicodeDecodeError,
+                ValueError) as e:
+            raise ValueError('Corrupt snapshot object') from e
+        if pos != end:
+            raise ValueError('Corrupt snapshot object')
+        return record
+
+    def __read_v1(self, f):
+        """Yields the records of a version 1 file"""
+        classes, names = [], []
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            if tag == b'O':
+                size = self.__u32.unpack(self.__read(f, 4))[0]
+                try:
+                    record = self.__unpack_object(self.__read(f, size),
+                                                  classes, names)
+                except (struct.error, IndexError, KeyError) as e:
+                    raise ValueError('Corrupt snapshot object') from e
+                yield record['__class__'] + '.' + record['id'], record
+            elif tag == b'C' or tag == b'A':
+                size = self.__u16.unpack(self.__read(f, 2))[0]
+                name = self.__read(f, size).decode()
+                (classes if tag == b'C' else names).append(name)
+            else:
+                raise ValueError('Corrupt snapshot entry {!r}'.format(tag))
+
+    def __unpack_object(self, data, classes, names):
+        """Decodes the body of an object entry"""
+        index, flags, uid, created, updated, count = \
+            self.__object.unpack_from(data)
+        record = {'__class__': classes[index]}
+        if flags & self.__uuid_id:
+            record['id'] = str(uuid.UUID(bytes=uid))
+        if flags & self.__packed_times:
+            record['created_at'] = self.__unpack_time(created)
+            record['updated_at'] = self.__unpack_time(updated)
+        pos = self.__object.size
+        for i in range(count):
+            name, kind = self.__field.unpack_from(data, pos)
+            pos += self.__field.size
+            if kind == b's' or kind == b'j':
+                size = self.__u32.unpack_from(data, pos)[0]
+                value = data[pos + 4:pos + 4 + size]
+                if len(value) != size:
+                    raise IndexError('string runs past the object')
+                value = value.decode() if kind == b's' else json.loads(value)
+                pos += 4 + size
+            elif kind == b'i':
+                value = self.__i64.unpack_from(data, pos)[0]
+                pos += 8
+            elif kind == b'f':
+                value = self.__f64.unpack_from(data, pos)[0]
+                pos += 8
+            elif kind == b'n':
+                value = None
+            elif kind == b'T' or kind == b'F':
+                value = kind == b'T'
+            else:
+                raise KeyError(kind)
+            record[names[name]] = value
+        return record
+
+    @staticmethod
+    def __pack_uuid(value):
+        """Returns the 16 bytes of a canonical UUID string, else None"""
+        if type(value) is not str or len(value) != 36 or \
+                value[8] != '-' or value[13] != '-' or value[18] != '-' or \
+                value[23] != '-' or value != value.lower():
+            return None
+        try:
+            data = bytes.fromhex(value.replace('-', ''))
+        except ValueError:
+            return None
+        return data if len(data) == 16 else None
+
+    def __unpack_time(self, micros):
+        """Returns the isoformat string of microseconds since the epoch"""
+        return (self.__epoch + self.__micro * micros).isoformat()
+
+    @classmethod
+    def __write_entry(cls, f, tag, body):
+        """Writes a class, attribute or shape definition"""
+        f.write(tag + cls.__u16.pack(len(body)) + body)
+
+    @staticmethod
+    def __read(f, size):
+        """Reads exactly size bytes from f"""
+        data = f.read(size)
+        if len(data) != size:
+            raise ValueError('Truncated snapshot')
+        return data
+
+
+serializers = {
+    '.json': JSONSerializer(),
+    '.jsonl': LinesSerializer(),
+    '.hbnb': BinarySerializer(),
+}
+
+
+def for_path(path):
+    """Returns the serializer for a storage file, file.json by default"""
+    return serializers.get(os.path.splitext(path)[1], serializers['.json'])
+
+
+def open_file(path, mode):
+    """Opens a storage file in text or binary mode as its format needs"""
+    if for_path(path).binary:
+        mode += 'b'
+    return open(path, mode)
+
+
+def read_file(path):
+    """Returns the key, record pairs of the file at path, [] if missing
+
+    Used as the worker when shards are decoded on a process pool.
+    """
+    try:
+        with open_file(path, 'r') as f:
+            return list(for_path(path).read(f))
+    except FileNotFoundError:
+        return []
+
+
+def convert(src, dst):
+    """Rewrites the storage file src in the format of dst, record by record
+
+    Returns the number of records converted.
+    """
+    count = 0
+
+    def items(f):
+        """Yields the records of f, counting them"""
+        nonlocal count
+        for item in for_path(src).read(f):
+            count += 1
+            yield item
+
+    with open_file(src, 'r') as f_in, open_file(dst, 'w') as f_out:
+        for_path(dst).write(f_out, items(f_in))
+    return count
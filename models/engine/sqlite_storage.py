@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+"""This module defines a class to manage SQLite storage for hbnb clone"""
+import os
+from sqlalchemy import event, text
+from models.engine.db_storage import DBStorage, make_engine
+
+
+class SQLiteStorage(DBStorage):
+    """This class manages storage of hbnb models in a SQLite file
+
+    The database lives at HBNB_SQLITE_PATH (hbnb.db by default). Every
+    connection runs in WAL mode so readers do not wait on the writer,
+    with the pragmas below. SQLite does not index foreign key columns on
+    its own, the models and the migrations in engine/migrations.py do.
+    """
+    pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'foreign_keys': 'ON',
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'cache_size': -64000,
+    }
+
+    def __init__(self, path=None, **options):
+        """Initialize SQLiteStorage on the database file at path
+
+        options are passed on to DBStorage.
+        """
+        if path is None:
+            path = os.getenv('HBNB_SQLITE_PATH', 'hbnb.db')
+        self.path = path
+        engine = make_engine('sqlite:///' + path)
+        event.listen(engine, 'connect', self.__configure)
+        super().__init__(engine, **options)
+
+    def __configure(self, connection, record):
+        """Applies the pragmas to a new DBAPI connection"""
+        cursor = connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+
+    def reload(self):
+        """Create and migrate the tables, then the current session"""
+        super().reload()
+        with self.engine.begin() as conn:
+            conn.execute(text('PRAGMA optimize'))
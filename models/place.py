@@ -5,19 +5,21 @@ from sqlalchemy import Column, String, Integer, Float, ForeignKey, Table
 from sqlalchemy.orm import relationship
 from os import getenv
 
-if getenv('HBNB_TYPE_STORAGE') == 'db':
+if getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'):
     place_amenity = Table('place_amenity', Base.metadata,
                          Column('place_id', String(60), ForeignKey('places.id'),
                                 primary_key=True, nullable=False),
                          Column('amenity_id', String(60), ForeignKey('amenities.id'),
-                                primary_key=True, nullable=False))
+                                primary_key=True, nullable=False, index=True))
 
 class Place(BaseModel, Base):
     """This class manages place objects"""
     __tablename__ = 'places'
     
-    city_id = Column(String(60), ForeignKey('cities.id'), nullable=False)
-    user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+    city_id = Column(String(60), ForeignKey('cities.id'), nullable=False,
+                     index=True)
+    user_id = Column(String(60), ForeignKey('users.id'), nullable=False,
+                     index=True)
     name = Column(String(128), nullable=False)
     description = Column(String(1024), nullable=True)
     number_rooms = Column(Integer, nullable=False, default=0)
@@ -27,7 +29,7 @@ class Place(BaseModel, Base):
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
     
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'):
         reviews = relationship('Review', backref='place', cascade='all, delete-orphan')
         amenities = relationship('Amenity', secondary=place_amenity,
                                back_populates='place_amenities')
@@ -37,11 +39,7 @@ class Place(BaseModel, Base):
             """Getter for reviews"""
             from models import storage
             from models.review import Review
-            review_list = []
-            for review in storage.all(Review).values():
-                if review.place_id == self.id:
-                    review_list.append(review)
-            return review_list
+            return storage.related(Review, 'place_id', self.id)
 
         @property
         def amenities(self):
@@ -62,4 +60,4 @@ class Place(BaseModel, Base):
                 if not hasattr(self, 'amenity_ids'):
                     self.amenity_ids = []
                 if obj.id not in self.amenity_ids:
-                    self.amenity_ids.append(obj.id)
+                    self.amenity_ids = self.amenity_ids + [obj.id]
@@ -2,7 +2,6 @@
 """This module defines a class to manage review objects"""
 from models.base_model import BaseModel, Base
 from sqlalchemy import Column, String, ForeignKey
-from sqlalchemy.orm import relationship
 from os import getenv
 
 class Review(BaseModel, Base):
@@ -10,13 +9,13 @@ class Review(BaseModel, Base):
     __tablename__ = 'reviews'
     
     text = Column(String(1024), nullable=False)
-    place_id = Column(String(60), ForeignKey('places.id'), nullable=False)
-    user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+    place_id = Column(String(60), ForeignKey('places.id'), nullable=False,
+                      index=True)
+    user_id = Column(String(60), ForeignKey('users.id'), nullable=False,
+                     index=True)
     
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
-        place = relationship('Place', backref='reviews', cascade='all, delete-orphan')
-        user = relationship('User', backref='reviews', cascade='all, delete-orphan')
-    else:
+    # with a database, Place.reviews and User.reviews add place and user
+    if getenv('HBNB_TYPE_STORAGE') not in ('db', 'sqlite'):
         @property
         def place(self):
             """Getter for place"""
@@ -9,9 +9,9 @@ class State(BaseModel, Base):
     """This class manages state objects"""
     __tablename__ = 'states'
     
-    name = Column(String(128), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
     
-    if getenv('HBNB_TYPE_STORAGE') == 'db':
+    if getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'):
         cities = relationship('City', backref='state', cascade='all, delete-orphan')
     else:
         @property
@@ -19,8 +19,4 @@ class State(BaseModel, Base):
             """Getter for cities"""
             from models import storage
             from models.city import City
-            city_list = []
-            for city in storage.all(City).values():
-                if city.state_id == self.id:
-                    city_list.append(city)
-            return city_list
+            return storage.related(City, 'state_id', self.id)
@@ -97,3 +97,18 @@ class test_basemodel(unittest.TestCase):
         n = new.to_dict()
         new = BaseModel(**n)
         self.assertFalse(new.created_at == new.updated_at)
+
+    def test_changed_attributes(self):
+        """ Attribute assignments are tracked until cleared """
+        new = self.value()
+        new.clear_changes()
+        self.assertEqual(new.changed_attributes(), frozenset())
+        new.name = 'changed'
+        self.assertEqual(new.changed_attributes(), {'name'})
+        new.clear_changes()
+        self.assertEqual(new.changed_attributes(), frozenset())
+
+    def test_kwargs_clean(self):
+        """ Instances rebuilt from a dict start without changes """
+        new = self.value(**self.value().to_dict())
+        self.assertEqual(new.changed_attributes(), frozenset())
@@ -1,6 +1,10 @@
 #!/usr/bin/python3
 """ Module for testing file storage"""
+import json
+import sys
 import unittest
+from collections.abc import Mapping
+from types import MappingProxyType
 from models.base_model import BaseModel
 from models import storage
 import os
@@ -11,11 +15,8 @@ class test_fileStorage(unittest.TestCase):
 
     def setUp(self):
         """ Set up test environment """
-        del_list = []
-        for key in storage._FileStorage__objects.keys():
-            del_list.append(key)
-        for key in del_list:
-            del storage._FileStorage__objects[key]
+        for obj in list(storage.all().values()):
+            storage.delete(obj)
 
     def tearDown(self):
         """ Remove storage file at end of tests """
@@ -39,7 +40,7 @@ class test_fileStorage(unittest.TestCase):
         """ __objects is properly returned """
         new = BaseModel()
         temp = storage.all()
-        self.assertIsInstance(temp, dict)
+        self.assertIsInstance(temp, Mapping)
 
     def test_base_model_instantiation(self):
         """ File is not created on BaseModel save """
@@ -91,8 +92,11 @@ class test_fileStorage(unittest.TestCase):
         self.assertEqual(type(storage._FileStorage__file_path), str)
 
     def test_type_objects(self):
-        """ Confirm __objects is a dict """
-        self.assertEqual(type(storage.all()), dict)
+        """ Confirm all() is a read-only view of __objects """
+        objs = storage.all()
+        self.assertEqual(type(objs), MappingProxyType)
+        with self.assertRaises(TypeError):
+            objs['BaseModel.x'] = BaseModel()
 
     def test_key_format(self):
         """ Key is properly formatted """
@@ -102,8 +106,707 @@ class test_fileStorage(unittest.TestCase):
             temp = key
         self.assertEqual(temp, 'BaseModel' + '.' + _id)
 
+    def test_all_cls(self):
+        """ all(cls) only returns objects of that class """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        storage.new(BaseModel())
+        self.assertEqual(list(storage.all(State)), ['State.' + state.id])
+        self.assertEqual(list(storage.all('State')), ['State.' + state.id])
+        self.assertEqual(len(storage.all(BaseModel)), 2)
+
+    def test_all_cls_view(self):
+        """ all(cls) is a read-only snapshot later writes leave alone """
+        from models.city import City
+        view = storage.all(City)
+        city = City()
+        storage.new(city)
+        self.assertNotIn('City.' + city.id, view)
+        self.assertIn('City.' + city.id, storage.all(City))
+        with self.assertRaises(TypeError):
+            view['City.x'] = city
+        view = storage.all(City)
+        storage.delete(city)
+        self.assertEqual(len(view), 1)
+        self.assertEqual(len(storage.all(City)), 0)
+
+    def test_snapshot_reuse(self):
+        """ Unchanged classes hand out the same snapshot """
+        from models.city import City
+        from models.state import State
+        version = storage.version
+        cities = storage.all(City)
+        objs = storage.all()
+        storage.new(State())
+        self.assertGreater(storage.version, version)
+        self.assertIs(storage.all(City), cities)
+        self.assertIsNot(storage.all(), objs)
+
+    def test_related(self):
+        """ Reverse foreign key index follows new, update and delete """
+        from models.state import State
+        from models.city import City
+        ca, ny = State(), State()
+        city = City()
+        city.state_id = ca.id
+        storage.new(city)
+        self.assertEqual(ca.cities, [city])
+        city.state_id = ny.id
+        self.assertEqual(ca.cities, [])
+        self.assertEqual(ny.cities, [city])
+        city.__dict__.update({'state_id': ca.id})
+        storage.new(city)
+        self.assertEqual(ca.cities, [city])
+        self.assertEqual(ny.cities, [])
+        storage.delete(city)
+        self.assertEqual(ca.cities, [])
+
+    def test_get(self):
+        """ get() looks an object up by class and id """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        self.assertIs(storage.get(State, state.id), state)
+        self.assertIs(storage.get('State', state.id), state)
+        self.assertIsNone(storage.get('City', state.id))
+        self.assertIsNone(storage.get(State, None))
+
+    def test_count(self):
+        """ count() follows inserts and deletes """
+        from models.state import State
+        states = [State(), State()]
+        for state in states:
+            storage.new(state)
+        storage.new(BaseModel())
+        self.assertEqual(storage.count(), 3)
+        self.assertEqual(storage.count(State), 2)
+        self.assertEqual(storage.count('BaseModel'), 3)
+        self.assertEqual(storage.count(BaseModel),
+                         len(storage.all(BaseModel)))
+        storage.delete(states[0])
+        self.assertEqual(storage.count('State'), 1)
+        self.assertEqual(storage.count(), 2)
+
+    def test_close_unchanged(self):
+        """ close() keeps the loaded objects while the file is unchanged """
+        from models.state import State
+        state = State()
+        storage.new(state)
+        storage.save()
+        storage.reload()
+        loaded = storage.get(State, state.id)
+        storage.close()
+        self.assertIs(storage.get(State, state.id), loaded)
+
+    def test_close_changed(self):
+        """ close() picks up changes written by another storage """
+        from models.engine.file_storage import FileStorage
+        from models.state import State
+        storage.save()
+        storage.reload()
+        other = FileStorage()
+        other.reload()
+        state = State()
+        other.new(state)
+        other.save()
+        self.assertIsNone(storage.get(State, state.id))
+        storage.close()
+        self.assertEqual(storage.get(State, state.id).id, state.id)
+
+    def test_save_reuses_records(self):
+        """ save() only serializes objects that changed """
+        from unittest import mock
+        objs = [BaseModel() for i in range(3)]
+        for obj in objs:
+            storage.new(obj)
+        storage.save()
+        objs[1].name = 'changed'
+        with mock.patch.object(BaseModel, 'to_dict', autospec=True,
+                               side_effect=BaseModel.to_dict) as to_dict:
+            storage.save()
+        self.assertEqual(to_dict.call_count, 1)
+        storage.reload()
+        self.assertEqual(storage.get(BaseModel, objs[1].id).name, 'changed')
+
+    def test_new_rewrites_record(self):
+        """ new() saves changes made to __dict__ directly """
+        obj = BaseModel()
+        obj.name = 'a'
+        storage.new(obj)
+        storage.save()
+        obj.__dict__.update({'name': 'b'})
+        storage.new(obj)
+        storage.save()
+        storage.reload()
+        self.assertEqual(storage.get(BaseModel, obj.id).name, 'b')
+
     def test_storage_var_created(self):
         """ FileStorage object storage created """
         from models.engine.file_storage import FileStorage
         print(type(storage))
         self.assertEqual(type(storage), FileStorage)
+
+
+class test_fileStorageJournal(unittest.TestCase):
+    """ Class to test the append-only journal mode of file storage """
+
+    path = 'journal.json'
+
+    def setUp(self):
+        """ Set up a journaled storage on its own file """
+        from models.engine.file_storage import FileStorage
+        self.storage = FileStorage(file_path=self.path, journal=True)
+
+    def tearDown(self):
+        """ Remove snapshot and journal at end of tests """
+        for path in (self.path, self.path + '.log'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def reopen(self):
+        """ Returns a fresh storage reloaded from the same files """
+        from models.engine.file_storage import FileStorage
+        other = FileStorage(file_path=self.path, journal=True)
+        other.reload()
+        return other
+
+    def test_save_appends(self):
+        """ save() appends to the journal instead of the snapshot """
+        new = BaseModel()
+        self.storage.new(new)
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        with open(self.storage.journal_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        new.name = 'changed'
+        self.storage.new(new)
+        self.storage.save()
+        with open(self.storage.journal_path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_reload_replays(self):
+        """ reload() applies puts and deletes from the journal """
+        keep, gone = BaseModel(), BaseModel()
+        self.storage.new(keep)
+        self.storage.new(gone)
+        self.storage.save()
+        self.storage.delete(gone)
+        keep.name = 'kept'
+        self.storage.new(keep)
+        self.storage.save()
+        objs = self.reopen().all()
+        self.assertEqual(list(objs), ['BaseModel.' + keep.id])
+        self.assertEqual(objs['BaseModel.' + keep.id].name, 'kept')
+
+    def test_compact(self):
+        """ compact() folds the journal into the snapshot """
+        new = BaseModel()
+        self.storage.new(new)
+        self.storage.save()
+        self.storage.compact()
+        self.assertFalse(os.path.exists(self.storage.journal_path))
+        self.assertIn('BaseModel.' + new.id, self.reopen().all())
+
+    def test_torn_tail(self):
+        """ A partial record at the end of the journal is dropped """
+        new = BaseModel()
+        self.storage.new(new)
+        self.storage.save()
+        with open(self.storage.journal_path, 'a') as f:
+            f.write('{"k": "BaseModel.x", "v": {')
+        other = self.reopen()
+        self.assertEqual(list(other.all()), ['BaseModel.' + new.id])
+        other.new(BaseModel())
+        other.save()
+        self.assertEqual(len(self.reopen().all()), 2)
+
+
+class test_fileStorageLazy(unittest.TestCase):
+    """ Class to test lazy materialization in file storage """
+
+    path = 'lazy.json'
+
+    def setUp(self):
+        """ Write a small graph and open it lazily """
+        from models.engine.file_storage import FileStorage
+        from models.state import State
+        from models.city import City
+        writer = FileStorage(file_path=self.path)
+        self.state = State()
+        self.city = City()
+        self.city.state_id = self.state.id
+        for obj in (self.state, self.city, BaseModel()):
+            writer.new(obj)
+        writer.save()
+        self.storage = FileStorage(file_path=self.path, lazy=True)
+        self.storage.reload()
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def built(self):
+        """ Returns the keys that have been materialized so far """
+        return set(self.storage._FileStorage__objects)
+
+    def test_reload_builds_nothing(self):
+        """ reload() only indexes records """
+        self.assertEqual(self.built(), set())
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count('City'), 1)
+
+    def test_get(self):
+        """ get() builds just the requested object, once """
+        state = self.storage.get('State', self.state.id)
+        self.assertEqual(state.id, self.state.id)
+        self.assertEqual(self.built(), {'State.' + self.state.id})
+        self.assertIs(self.storage.get('State', self.state.id), state)
+
+    def test_all_cls(self):
+        """ all(cls) builds only that class """
+        self.assertEqual(len(self.storage.all('City')), 1)
+        self.assertEqual(self.built(), {'City.' + self.city.id})
+        self.assertEqual(len(self.storage.all()), 3)
+
+    def test_related(self):
+        """ related() builds the children it returns """
+        cities = self.storage.related('City', 'state_id', self.state.id)
+        self.assertEqual([c.id for c in cities], [self.city.id])
+        self.assertEqual(self.built(), {'City.' + self.city.id})
+
+    def test_save_unbuilt(self):
+        """ Records never built are saved as they were read """
+        from models.engine.file_storage import FileStorage
+        self.storage.save()
+        other = FileStorage(file_path=self.path)
+        other.reload()
+        self.assertEqual(other.count(), 3)
+        self.assertEqual(other.get('City', self.city.id).state_id,
+                         self.state.id)
+
+
+class test_fileStorageShards(unittest.TestCase):
+    """ Class to test sharded file storage layouts """
+
+    path = 'shards.json'
+
+    def tearDown(self):
+        """ Remove shard files at end of tests """
+        for name in os.listdir('.'):
+            if name.startswith('shards.'):
+                os.remove(name)
+
+    def open(self, shards):
+        """ Returns a storage reloaded from the shard files """
+        from models.engine.file_storage import FileStorage
+        storage = FileStorage(file_path=self.path, shards=shards)
+        storage._FileStorage__parallel_min = 0
+        storage.reload()
+        return storage
+
+    def test_class_shards(self):
+        """ Each class is saved to its own file """
+        from models.state import State
+        storage = self.open('class')
+        state = State()
+        storage.new(state)
+        storage.new(BaseModel())
+        storage.save()
+        self.assertTrue(os.path.exists('shards.State.json'))
+        self.assertTrue(os.path.exists('shards.BaseModel.json'))
+        self.assertFalse(os.path.exists(self.path))
+        other = self.open('class')
+        self.assertEqual(other.count(), 2)
+        self.assertEqual(other.get(State, state.id).id, state.id)
+
+    def test_save_dirty_shards(self):
+        """ Only shards holding changed objects are rewritten """
+        from models.state import State
+        storage = self.open('class')
+        state = State()
+        storage.new(state)
+        storage.new(BaseModel())
+        storage.save()
+        before = os.stat('shards.BaseModel.json').st_ino
+        state.name = 'changed'
+        storage.new(state)
+        storage.save()
+        self.assertEqual(os.stat('shards.BaseModel.json').st_ino, before)
+        other = self.open('class')
+        self.assertEqual(other.get(State, state.id).name, 'changed')
+
+    def test_save_visits_dirty_shards(self):
+        """ Saving one changed object only encodes its own shard """
+        from unittest import mock
+        from models.state import State
+        for shards, expected in (('class', 1), (4, None)):
+            storage = self.open(shards)
+            state = State()
+            objs = [BaseModel() for i in range(20)]
+            for obj in objs + [state]:
+                storage.new(obj)
+            storage.save()
+            state.name = 'changed'
+            storage.new(state)
+            record = storage._FileStorage__record
+            with mock.patch.object(storage, '_FileStorage__record',
+                                   wraps=record) as visit:
+                storage.save()
+            keys = {c.args[0] for c in visit.call_args_list}
+            self.assertIn('State.' + state.id, keys)
+            self.assertLess(len(keys), 21)
+            if expected is not None:
+                self.assertEqual(len(keys), expected)
+            self.assertEqual(self.open(shards).get(State, state.id).name,
+                             'changed')
+            self.tearDown()
+
+    def test_save_retry(self):
+        """ A change is still saved by the next save() after a failed one """
+        from unittest import mock
+        from models.state import State
+        for shards in ('class', 4):
+            storage = self.open(shards)
+            state = State()
+            storage.new(state)
+            storage.new(BaseModel())
+            storage.save()
+            state.name = 'changed'
+            storage.new(state)
+            with mock.patch('os.replace', side_effect=OSError):
+                self.assertRaises(OSError, storage.save)
+            self.assertIsNone(getattr(self.open(shards).get(State, state.id),
+                                      'name', None))
+            storage.save()
+            self.assertEqual(self.open(shards).get(State, state.id).name,
+                             'changed')
+            self.tearDown()
+
+    def test_hash_shards(self):
+        """ Keys are spread over hashed shard files """
+        objs = [BaseModel() for i in range(20)]
+        storage = self.open(3)
+        for obj in objs:
+            storage.new(obj)
+        storage.save()
+        for i in range(3):
+            self.assertTrue(os.path.exists('shards.{}.json'.format(i)))
+        other = self.open('3')
+        self.assertEqual(set(other.all()),
+                         {'BaseModel.' + obj.id for obj in objs})
+
+
+class test_fileStorageWriteBehind(unittest.TestCase):
+    """ Class to test the write-behind flusher of file storage """
+
+    path = 'behind.json'
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def storage(self, flush_ms, flush_changes=1000):
+        """ Returns a write-behind storage on its own file """
+        from models.engine.file_storage import FileStorage
+        return FileStorage(file_path=self.path, flush_ms=flush_ms,
+                           flush_changes=flush_changes)
+
+    def saved_ids(self):
+        """ Returns the ids currently persisted on disk """
+        from models.engine.file_storage import FileStorage
+        other = FileStorage(file_path=self.path)
+        other.reload()
+        return {obj.id for obj in other.all().values()}
+
+    def wait_for_file(self):
+        """ Waits up to two seconds for the flusher to write """
+        import time
+        deadline = time.monotonic() + 2
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_save_defers(self):
+        """ save() leaves the write to flush() """
+        storage = self.storage(60000)
+        storage.flush()
+        new = BaseModel()
+        storage.new(new)
+        storage.save()
+        self.assertEqual(self.saved_ids(), set())
+        storage.flush()
+        self.assertEqual(self.saved_ids(), {new.id})
+
+    def test_interval(self):
+        """ The flusher writes once the interval has passed """
+        storage = self.storage(10)
+        new = BaseModel()
+        storage.new(new)
+        storage.save()
+        self.wait_for_file()
+        self.assertEqual(self.saved_ids(), {new.id})
+
+    def test_group_commit(self):
+        """ Enough saves trigger a flush before the interval """
+        storage = self.storage(60000, flush_changes=3)
+        storage.flush()
+        os.remove(self.path)
+        objs = [BaseModel() for i in range(3)]
+        for obj in objs:
+            storage.new(obj)
+            storage.save()
+        self.wait_for_file()
+        self.assertEqual(self.saved_ids(), {obj.id for obj in objs})
+
+    def test_close_flushes(self):
+        """ close() makes saved changes durable """
+        storage = self.storage(60000)
+        storage.flush()
+        new = BaseModel()
+        storage.new(new)
+        storage.save()
+        storage.close()
+        self.assertEqual(self.saved_ids(), {new.id})
+
+    def test_failed_flush_waits(self):
+        """ The flusher retries a failed write once per interval """
+        import time
+        from unittest import mock
+        storage = self.storage(100, flush_changes=1)
+        new = BaseModel()
+        storage.new(new)
+        with mock.patch('os.replace', side_effect=OSError) as replace:
+            storage.save()
+            time.sleep(0.5)
+        self.assertGreaterEqual(replace.call_count, 1)
+        self.assertLessEqual(replace.call_count, 7)
+        os.remove(self.path + '.tmp')
+        storage.flush()
+        self.assertEqual(self.saved_ids(), {new.id})
+
+
+class test_fileStorageBatch(unittest.TestCase):
+    """ Class to test batched saves in file storage """
+
+    path = 'batch.json'
+
+    def setUp(self):
+        """ Set up a storage on its own file """
+        from models.engine.file_storage import FileStorage
+        self.storage = FileStorage(file_path=self.path)
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def serialized(self):
+        """ Returns the records saved in the storage file """
+        import json
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_batch_defers_save(self):
+        """ save() calls in a batch are written once, at the end """
+        from unittest import mock
+        objs = [BaseModel() for i in range(5)]
+        with mock.patch.object(self.storage, 'flush',
+                               wraps=self.storage.flush) as flush:
+            with self.storage.batch():
+                for obj in objs:
+                    self.storage.new(obj)
+                    self.storage.save()
+                self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(flush.call_count, 1)
+        self.assertEqual(len(self.serialized()), 5)
+
+    def test_batch_rollback(self):
+        """ An exception undoes the changes staged in the batch """
+        kept, gone = BaseModel(), BaseModel()
+        self.storage.new(kept)
+        self.storage.save()
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self.storage.new(gone)
+                self.storage.delete(kept)
+                self.storage.save()
+                raise RuntimeError
+        self.assertEqual(list(self.storage.all()), ['BaseModel.' + kept.id])
+        self.storage.save()
+        self.assertEqual(list(self.serialized()),
+                         ['BaseModel.' + kept.id])
+
+    def test_nested_batch(self):
+        """ Inner batches join the outer one """
+        with self.storage.batch():
+            with self.storage.batch():
+                self.storage.new(BaseModel())
+                self.storage.save()
+            self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_batch_per_thread(self):
+        """ Another thread saves and keeps its objects during a batch """
+        import threading
+        kept, gone, other = BaseModel(), BaseModel(), BaseModel()
+        self.storage.new(kept)
+        self.storage.save()
+
+        def write():
+            self.storage.new(other)
+            self.storage.save()
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self.storage.new(gone)
+                self.storage.delete(kept)
+                thread = threading.Thread(target=write)
+                thread.start()
+                thread.join()
+                self.assertEqual(set(self.serialized()),
+                                 {'BaseModel.' + kept.id,
+                                  'BaseModel.' + other.id})
+                raise RuntimeError
+        expected = {'BaseModel.' + kept.id, 'BaseModel.' + other.id}
+        self.assertEqual(set(self.storage.all()), expected)
+        self.storage.save()
+        self.assertEqual(set(self.serialized()), expected)
+
+
+class test_fileStorageThreads(unittest.TestCase):
+    """ Class to test concurrent readers and writers on file storage """
+
+    path = 'threads.json'
+
+    def setUp(self):
+        """ Set up a storage on its own file """
+        from models.engine.file_storage import FileStorage
+        self.storage = FileStorage(file_path=self.path)
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        sys.setswitchinterval(self.interval)
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def test_no_torn_reads(self):
+        """ Readers iterate consistent snapshots while writers churn """
+        import threading
+        from models.city import City
+        from models.state import State
+        state = State()
+        self.storage.new(state)
+        done = threading.Event()
+        errors = []
+
+        def write():
+            """ Adds and removes cities of state """
+            try:
+                for i in range(300):
+                    city = City(state_id=state.id)
+                    self.storage.new(city)
+                    if i % 2:
+                        self.storage.delete(city)
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            """ Walks snapshots and checks they never change """
+            try:
+                while not done.is_set():
+                    cities = self.storage.all(City)
+                    keys = [key for key in cities]
+                    for key, city in cities.items():
+                        self.assertEqual(key, 'City.' + city.id)
+                    self.assertEqual(list(cities), keys)
+                    objs = self.storage.all()
+                    self.assertEqual(len(list(objs.values())), len(objs))
+                    for city in self.storage.related(City, 'state_id',
+                                                     state.id):
+                        self.assertIsInstance(city, City)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for i in range(4)]
+        writers = [threading.Thread(target=write) for i in range(4)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.storage.all(City)), 600)
+        self.assertEqual(len(self.storage.related(City, 'state_id',
+                                                  state.id)), 600)
+
+
+class test_fileStorageBulk(unittest.TestCase):
+    """ Class to test bulk loading into file storage """
+
+    path = 'bulk.json'
+
+    def setUp(self):
+        """ Set up a storage on its own file """
+        from models.engine.file_storage import FileStorage
+        self.storage = FileStorage(file_path=self.path)
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def test_bulk_insert(self):
+        """ Rows become objects and are written in one save """
+        from unittest import mock
+        from models.city import City
+        rows = [{'name': 'City {}'.format(i), 'state_id': 'ca'}
+                for i in range(50)]
+        with mock.patch.object(self.storage, 'flush',
+                               wraps=self.storage.flush) as flush:
+            result = self.storage.bulk_insert(City, rows)
+        self.assertEqual(flush.call_count, 1)
+        self.assertEqual(result.rows, 50)
+        self.assertGreater(result.rate, 0)
+        self.assertEqual(len(self.storage.related(City, 'state_id', 'ca')),
+                         50)
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)), 50)
+
+    def test_bulk_insert_duplicate(self):
+        """ Inserting a stored id changes nothing """
+        from models.state import State
+        self.storage.bulk_insert('State', [{'id': 'a', 'name': 'A'}])
+        with self.assertRaises(ValueError):
+            self.storage.bulk_insert('State', [{'id': 'b', 'name': 'B'},
+                                               {'id': 'a', 'name': 'C'}])
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(self.storage.get(State, 'a').name, 'A')
+
+    def test_bulk_upsert(self):
+        """ Stored objects are updated, the others created """
+        from models.state import State
+        self.storage.bulk_insert(State, [{'id': 'a', 'name': 'A'}])
+        state = self.storage.get(State, 'a')
+        created = state.created_at
+        self.storage.bulk_upsert(State, [{'id': 'a', 'name': 'Z'},
+                                         {'id': 'b', 'name': 'B'}])
+        self.assertIs(self.storage.get(State, 'a'), state)
+        self.assertEqual((state.name, state.created_at), ('Z', created))
+        self.assertEqual(self.storage.get(State, 'b').name, 'B')
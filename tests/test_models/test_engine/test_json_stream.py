@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+""" Module for testing the streaming storage reader"""
+import io
+import json
+import os
+import unittest
+from models.base_model import BaseModel
+from models.engine import json_stream
+from models.engine.file_storage import FileStorage
+
+
+class test_jsonStream(unittest.TestCase):
+    """ Class to test record by record reading and writing """
+
+    doc = {
+        'BaseModel.1': {'id': '1', '__class__': 'BaseModel', 'n': [1, 2]},
+        'BaseModel.2': {'id': '2', '__class__': 'BaseModel', 's': 'a, "}'},
+        'BaseModel.3': {'id': '3', '__class__': 'BaseModel', 'f': 1.5},
+    }
+
+    def test_iter_items(self):
+        """ Items match json.load for every chunk size """
+        text = json.dumps(self.doc, indent=2)
+        for size in (1, 2, 7, 64, 1 << 16):
+            items = json_stream.iter_items(io.StringIO(text), size)
+            self.assertEqual(dict(items), self.doc)
+
+    def test_iter_items_empty_object(self):
+        """ An empty object yields nothing """
+        self.assertEqual(list(json_stream.iter_items(io.StringIO(' {} '))),
+                         [])
+
+    def test_iter_items_invalid(self):
+        """ Empty or truncated input raises ValueError """
+        for text in ('', '{"a": {"b": 1}', '{"a" {}}', '{1: {}}'):
+            with self.assertRaises(ValueError):
+                list(json_stream.iter_items(io.StringIO(text), 4))
+
+    def test_write_items(self):
+        """ write_items produces the file.json layout """
+        f = io.StringIO()
+        json_stream.write_items(f, self.doc.items())
+        self.assertEqual(json.loads(f.getvalue()), self.doc)
+
+    def test_lines_round_trip(self):
+        """ Line-delimited records read back keyed by class and id """
+        f = io.StringIO()
+        json_stream.write_lines(f, self.doc.items())
+        f.seek(0)
+        self.assertEqual(dict(json_stream.iter_lines(f)), self.doc)
+
+
+class test_fileStorageLines(unittest.TestCase):
+    """ Class to test file storage on the line-delimited layout """
+
+    path = 'lines.jsonl'
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def test_save_reload(self):
+        """ Objects survive a save and reload in the .jsonl layout """
+        storage = FileStorage(file_path=self.path)
+        new = BaseModel()
+        storage.new(new)
+        storage.save()
+        with open(self.path) as f:
+            self.assertEqual(json.loads(f.readline())['id'], new.id)
+        other = FileStorage(file_path=self.path)
+        other.reload()
+        self.assertEqual(list(other.all()), ['BaseModel.' + new.id])
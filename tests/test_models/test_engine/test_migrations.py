@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+""" Module for testing the schema migrations """
+import os
+import unittest
+from sqlalchemy import Column, Integer, String, inspect, text
+from models.engine import migrations
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.user import User
+
+
+class test_migrations(unittest.TestCase):
+    """ Class to test migrating a SQLite database """
+
+    path = 'migrate.db'
+
+    def setUp(self):
+        """ Set up a migrated storage on its own database """
+        self.storage = SQLiteStorage(self.path)
+        self.storage.reload()
+        self.engine = self.storage.engine
+
+    def tearDown(self):
+        """ Remove the database at end of tests """
+        self.storage.close()
+        self.engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def indexed(self, table):
+        """ Returns the columns of table leading an index """
+        return [i['column_names'][0]
+                for i in inspect(self.engine).get_indexes(table)]
+
+    def downgrade(self):
+        """ Drops the lookup indexes and the recorded versions """
+        with self.engine.begin() as conn:
+            for table in ('cities', 'users'):
+                for index in inspect(conn).get_indexes(table):
+                    conn.execute(text('DROP INDEX ' + index['name']))
+            conn.execute(migrations.schema_version.delete())
+        self.engine.dispose()
+
+    def test_reload_migrates(self):
+        """ reload() records the latest version on a new database """
+        with self.engine.connect() as conn:
+            self.assertEqual(migrations.version(conn),
+                             max(migrations.migrations))
+        self.assertEqual(migrations.migrate(self.engine), [])
+        self.assertIn('state_id', self.indexed('cities'))
+        self.assertIn('email', self.indexed('users'))
+        self.assertIn('name', self.indexed('states'))
+
+    def test_migrate_old_database(self):
+        """ Pending migrations add what an old database lacks, once """
+        self.downgrade()
+        self.assertEqual(self.indexed('users'), [])
+        self.assertEqual(migrations.migrate(self.engine, target=0), [])
+        self.assertEqual(migrations.migrate(self.engine), [1])
+        self.assertIn('email', self.indexed('users'))
+        self.assertEqual(migrations.migrate(self.engine), [])
+
+    def test_add_index(self):
+        """ add_index() skips columns leading an index or the key """
+        with self.engine.begin() as conn:
+            self.assertFalse(migrations.add_index(conn, 'cities',
+                                                  'state_id'))
+            self.assertFalse(migrations.add_index(conn, 'cities', 'id'))
+            self.assertFalse(migrations.add_index(conn, 'missing', 'id'))
+            self.assertTrue(migrations.add_index(conn, 'users',
+                                                 'last_name'))
+        self.assertIn('last_name', self.indexed('users'))
+
+    def test_add_column(self):
+        """ add_column() adds a column with its default, once """
+        column = Column('guests', Integer, nullable=False,
+                        server_default='2')
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO states (id, created_at, "
+                              "updated_at, name) VALUES ('s', '2020-01-01', "
+                              "'2020-01-01', 'Texas')"))
+            self.assertTrue(migrations.add_column(conn, 'states', column))
+            self.assertFalse(migrations.add_column(
+                conn, 'states', Column('guests', String(8))))
+            self.assertEqual(conn.execute(
+                text('SELECT guests FROM states')).scalar(), 2)
+
+    def test_explain(self):
+        """ explain() shows lookups using the indexes, scans without """
+        by_state = self.storage.query(City).filter(state_id='s')
+        by_email = self.storage.query(User).filter(email='a@b.c')
+        self.assertIn('ix_cities_state_id',
+                      ' '.join(self.storage.explain(by_state)))
+        self.assertIn('ix_users_email',
+                      ' '.join(self.storage.explain(by_email)))
+        self.downgrade()
+        self.assertIn('SCAN', ' '.join(self.storage.explain(by_email)))
+
+    def test_in_memory(self):
+        """ Migrating keeps an in-memory database and its tables """
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import StaticPool
+        from models.engine.db_storage import DBStorage
+        from models.state import State
+        for options in ({'poolclass': StaticPool}, {}):
+            engine = create_engine('sqlite://', **options)
+            self.assertFalse(migrations.recyclable(engine))
+            storage = DBStorage(engine=engine)
+            storage.reload()
+            state = State()
+            state.name = 'Utah'
+            storage.new(state)
+            storage.save()
+            storage.close()
+            self.assertEqual(storage.count(State), 1)
+            self.assertIn('State.' + state.id, storage.all())
+            storage.close()
+            engine.dispose()
+        self.assertTrue(migrations.recyclable(self.engine))
+
+    def test_concurrent_migrate(self):
+        """ A version another process applied first counts as applied """
+        from unittest import mock
+        real = migrations.version
+        calls = []
+
+        def stale(conn):
+            """ Reads version 0 once, as a process starting alongside """
+            calls.append(conn)
+            return 0 if len(calls) == 1 else real(conn)
+        with mock.patch.object(migrations, 'version', side_effect=stale):
+            self.assertEqual(migrations.migrate(self.engine), [])
+        self.assertEqual(len(calls), 2)
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(
+                migrations.schema_version.select()).all()[0].version, 1)
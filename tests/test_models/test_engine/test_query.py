@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+""" Module for testing storage queries on every engine """
+import os
+import unittest
+from unittest import mock
+from models.city import City
+from models.engine.query import cursor
+from models.state import State
+from models.user import User
+
+
+class queryTests:
+    """ Query tests shared by the storage engines, self.storage is set """
+
+    def make(self, cls, **attrs):
+        """ Stores a new cls instance with the given attributes """
+        obj = cls()
+        for name, value in attrs.items():
+            setattr(obj, name, value)
+        self.storage.new(obj)
+        self.objs.append(obj)
+        return obj
+
+    def fill(self):
+        """ Stores a few states, cities and users """
+        self.objs = []
+        self.ca = self.make(State, name='California')
+        self.az = self.make(State, name='Arizona')
+        self.make(State, name='Nevada')
+        self.storage.save()
+        for name in ('San Francisco', 'Los Angeles', 'Fresno'):
+            self.make(City, name=name, state_id=self.ca.id)
+        for name in ('Phoenix', 'Page'):
+            self.make(City, name=name, state_id=self.az.id)
+        self.make(User, email='a@b.c', password='x', first_name='Betty')
+        self.make(User, email='d@e.f', password='y')
+        self.storage.save()
+
+    def names(self, query):
+        """ Returns the names of the objects query finds """
+        return [obj.name for obj in query]
+
+    def test_filter_foreign_key(self):
+        """ Objects are found by their foreign key """
+        query = self.storage.query(City).filter(state_id=self.ca.id)
+        self.assertEqual(self.names(query.order_by('name')),
+                         ['Fresno', 'Los Angeles', 'San Francisco'])
+
+    def test_filter_many(self):
+        """ Every criterion has to match """
+        query = self.storage.query(City).filter(state_id=self.ca.id,
+                                                name='Fresno')
+        self.assertEqual(self.names(query), ['Fresno'])
+        query = self.storage.query(City).filter(state_id=self.az.id,
+                                                name='Fresno')
+        self.assertEqual(query.all(), [])
+        self.assertIsNone(query.first())
+
+    def test_filter_id(self):
+        """ first() finds an object by id """
+        state = self.storage.query(State).filter(id=self.az.id).first()
+        self.assertEqual(state.id, self.az.id)
+        self.assertIsNone(
+            self.storage.query('State').filter(id='missing').first())
+
+    def test_order_by(self):
+        """ Objects are sorted ascending or descending """
+        self.assertEqual(self.names(self.storage.query(State)
+                                    .order_by('name')),
+                         ['Arizona', 'California', 'Nevada'])
+        self.assertEqual(self.names(self.storage.query(State)
+                                    .order_by('-name')),
+                         ['Nevada', 'California', 'Arizona'])
+
+    def test_ties_by_id(self):
+        """ Objects with equal sort values come by id """
+        found = self.storage.query(City).order_by('state_id').all()
+        expected = sorted(found, key=lambda obj: (obj.state_id, obj.id))
+        self.assertEqual([obj.id for obj in found],
+                         [obj.id for obj in expected])
+
+    def test_missing_values(self):
+        """ Missing values sort first ascending, last descending """
+        query = self.storage.query(User)
+        self.assertEqual([u.first_name for u in query.order_by('first_name')],
+                         [None, 'Betty'])
+        self.assertEqual([u.first_name for u in
+                          query.order_by('-first_name')], ['Betty', None])
+
+    def test_limit_offset(self):
+        """ limit() and offset() page through sorted objects """
+        query = self.storage.query(City).order_by('name')
+        self.assertEqual(self.names(query.offset(1).limit(2)),
+                         ['Los Angeles', 'Page'])
+        self.assertEqual(self.names(query.offset(4)), ['San Francisco'])
+        self.assertEqual(query.limit(0).all(), [])
+
+    def test_count(self):
+        """ count() follows the criteria and the page """
+        query = self.storage.query(City)
+        self.assertEqual(query.count(), 5)
+        self.assertEqual(query.filter(state_id=self.az.id).count(), 2)
+        self.assertEqual(query.offset(1).limit(3).count(), 3)
+        self.assertEqual(query.offset(4).limit(3).count(), 1)
+
+    def test_refine(self):
+        """ Refining a query leaves the original alone """
+        query = self.storage.query(City)
+        query.filter(state_id=self.ca.id).limit(1)
+        self.assertEqual(query.count(), 5)
+
+    def test_iter_all(self):
+        """ iter_all() yields by class name, then id """
+        found = list(self.storage.iter_all(City, batch_size=2))
+        self.assertEqual([obj.id for obj in found],
+                         sorted(obj.id for obj in found))
+        self.assertEqual(len(found), 5)
+        kinds = [type(obj).__name__ for obj in self.storage.iter_all()
+                 if obj in self.objs]
+        self.assertEqual(kinds, ['City'] * 5 + ['State'] * 3 +
+                         ['User'] * 2)
+
+    def test_iter_all_cursor(self):
+        """ A cursor token resumes after the object it was made from """
+        found = list(self.storage.iter_all('City'))
+        rest = self.storage.iter_all('City', after=cursor(found[1]))
+        self.assertEqual(list(rest), found[2:])
+        rest = self.storage.iter_all(after=cursor(found[-1]))
+        self.assertEqual([type(obj) for obj in rest if obj in self.objs],
+                         [State] * 3 + [User] * 2)
+        with self.assertRaises(ValueError):
+            next(self.storage.iter_all(after='not a cursor'))
+
+
+class test_fileStorageQuery(queryTests, unittest.TestCase):
+    """ Class to test queries on file storage """
+
+    path = 'query.json'
+
+    def setUp(self):
+        """ Set up a filled storage on its own file """
+        from models.engine.file_storage import FileStorage
+        self.storage = FileStorage(file_path=self.path)
+        self.fill()
+
+    def tearDown(self):
+        """ Remove storage file at end of tests """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def test_index_lookup(self):
+        """ Foreign key and id lookups do not scan the class """
+        with mock.patch.object(self.storage, 'all',
+                               side_effect=AssertionError('scanned')):
+            self.assertEqual(self.storage.query(City)
+                             .filter(state_id=self.az.id).count(), 2)
+            self.assertIsNotNone(self.storage.query(State)
+                                 .filter(id=self.ca.id).first())
+
+
+class test_sqliteStorageQuery(queryTests, unittest.TestCase):
+    """ Class to test queries on a SQLite database """
+
+    path = 'query.db'
+
+    def setUp(self):
+        """ Set up a filled storage on its own database """
+        from models.engine.sqlite_storage import SQLiteStorage
+        self.storage = SQLiteStorage(self.path)
+        self.storage.reload()
+        self.fill()
+
+    def tearDown(self):
+        """ Remove the database at end of tests """
+        self.storage.close()
+        self.storage.engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+@unittest.skipUnless(os.getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'),
+                     'database storage only')
+class test_dbStorageQuery(queryTests, unittest.TestCase):
+    """ Class to test queries on database storage """
+
+    def setUp(self):
+        """ Fill the database storage """
+        from models import storage
+        self.storage = storage
+        self.fill()
+
+    def tearDown(self):
+        """ Remove the objects stored by setUp """
+        for obj in reversed(self.objs):
+            self.storage.delete(obj)
+            self.storage.save()
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+""" Module for testing the storage snapshot formats"""
+import io
+import os
+import struct
+import unittest
+import uuid
+from models.engine import serializers
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+class test_binarySerializer(unittest.TestCase):
+    """ Class to test the compact binary snapshot format """
+
+    records = {
+        'Place.0b7e4d3c-3f0a-4f4e-9b1e-2d6a1c8f9e01': {
+            '__class__': 'Place',
+            'id': '0b7e4d3c-3f0a-4f4e-9b1e-2d6a1c8f9e01',
+            'created_at': '2017-06-14T22:31:03.285259',
+            'updated_at': '2017-06-14T22:31:03.285259',
+            'name': 'Cosy été', 'number_rooms': 3,
+            'latitude': 37.77, 'description': None,
+            'amenity_ids': ['a', 'b'], 'big': 1 << 70, 'flag': True},
+        'User.not-a-uuid': {
+            '__class__': 'User', 'id': 'not-a-uuid',
+            'created_at': '2017-06-14T22:31:03',
+            'updated_at': '2017-06-14T22:31:03.000001',
+            'email': 'a@b.c'},
+    }
+
+    def dump(self):
+        """ Returns the records written in the binary format """
+        f = io.BytesIO()
+        serializers.BinarySerializer().write(f, self.records.items())
+        return f.getvalue()
+
+    def test_round_trip(self):
+        """ Records read back exactly as written """
+        f = io.BytesIO(self.dump())
+        self.assertEqual(dict(serializers.BinarySerializer().read(f)),
+                         self.records)
+
+    def test_header(self):
+        """ Files start with the magic and format version """
+        self.assertEqual(self.dump()[:6], b'HBNB\x02\x00')
+
+    def test_bad_version(self):
+        """ Unknown versions are refused """
+        data = b'HBNB\x03\x00' + self.dump()[6:]
+        with self.assertRaises(ValueError):
+            list(serializers.BinarySerializer().read(io.BytesIO(data)))
+
+    def test_chunks(self):
+        """ Entries split across read chunks decode the same """
+        serializer = serializers.BinarySerializer()
+        serializer._BinarySerializer__chunk = 7
+        self.assertEqual(dict(serializer.read(io.BytesIO(self.dump()))),
+                         self.records)
+
+    def test_version_1(self):
+        """ Files of the first version, timestamps packed, still read """
+        uid = '0b7e4d3c-3f0a-4f4e-9b1e-2d6a1c8f9e01'
+        body = (struct.pack('<HB16sqqH', 0, 3, uuid.UUID(uid).bytes,
+                            1497479463285259, 1497479463285259, 1) +
+                struct.pack('<HcI', 0, b's', 5) + b'Texas')
+        data = (b'HBNB\x01\x00' + b'C\x05\x00State' + b'A\x04\x00name' +
+                b'O' + struct.pack('<I', len(body)) + body)
+        self.assertEqual(
+            list(serializers.BinarySerializer().read(io.BytesIO(data))),
+            [('State.' + uid, {'__class__': 'State', 'id': uid,
+                               'created_at': '2017-06-14T22:31:03.285259',
+                               'updated_at': '2017-06-14T22:31:03.285259',
+                               'name': 'Texas'})])
+
+    def test_truncated(self):
+        """ A truncated file raises ValueError """
+        data = self.dump()[:-3]
+        with self.assertRaises(ValueError):
+            list(serializers.BinarySerializer().read(io.BytesIO(data)))
+
+    def test_smaller_than_json(self):
+        """ The binary snapshot is smaller than file.json """
+        f = io.StringIO()
+        serializers.JSONSerializer().write(f, self.records.items())
+        self.assertLess(len(self.dump()), len(f.getvalue().encode()))
+
+
+class test_convert(unittest.TestCase):
+    """ Class to test converting snapshots between formats """
+
+    paths = ('convert.json', 'convert.hbnb', 'convert2.json')
+
+    def tearDown(self):
+        """ Remove converted files at end of tests """
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_convert_both_ways(self):
+        """ file.json -> binary -> file.json keeps every record """
+        storage = FileStorage(file_path='convert.json')
+        place = Place()
+        place.name = 'Loft'
+        storage.new(place)
+        storage.save()
+        self.assertEqual(serializers.convert('convert.json',
+                                             'convert.hbnb'), 1)
+        self.assertEqual(serializers.convert('convert.hbnb',
+                                             'convert2.json'), 1)
+        self.assertEqual(serializers.read_file('convert2.json'),
+                         serializers.read_file('convert.json'))
+        binary = FileStorage(file_path='convert.hbnb')
+        binary.reload()
+        self.assertEqual(binary.get(Place, place.id).to_dict(),
+                         place.to_dict())
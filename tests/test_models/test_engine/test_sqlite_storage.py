@@ -0,0 +1,575 @@
+#!/usr/bin/python3
+""" Module for testing SQLite storage"""
+import os
+import unittest
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from models.engine.db_storage import statement
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.state import State
+
+
+def remove(path):
+    """ Removes a database and the files SQLite keeps next to it """
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def store(storage, cls, **attrs):
+    """ Stores and commits a new cls instance with the given attributes """
+    obj = cls()
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+    storage.new(obj)
+    storage.save()
+    return obj
+
+
+class sqliteTests:
+    """ Fixtures shared by the SQLite tests, path names the database
+
+    setUp() opens the storage with options, runs fill() and then records
+    every statement sent to the database in self.statements.
+    """
+
+    options = {}
+
+    def setUp(self):
+        """ Set up a storage on its own database """
+        self.storage = self.open()
+        self.fill()
+        self.statements = []
+        event.listen(self.storage.engine, 'before_cursor_execute',
+                     self.record)
+
+    def tearDown(self):
+        """ Remove the database at end of tests """
+        if event.contains(self.storage.engine, 'before_cursor_execute',
+                          self.record):
+            event.remove(self.storage.engine, 'before_cursor_execute',
+                         self.record)
+        self.storage.close()
+        self.storage.engine.dispose()
+        remove(self.path)
+
+    def open(self, **options):
+        """ Returns a reloaded storage on the database """
+        storage = SQLiteStorage(self.path, **dict(self.options, **options))
+        storage.reload()
+        return storage
+
+    def fill(self):
+        """ Stores what the tests start from, nothing by default """
+
+    def record(self, conn, cursor, statement, *args):
+        """ Remembers every statement sent to the database """
+        self.statements.append(statement)
+
+    def add(self, cls, **attrs):
+        """ Stores a new cls instance with the given attributes """
+        return store(self.storage, cls, **attrs)
+
+
+class test_sqliteStorage(sqliteTests, unittest.TestCase):
+    """ Class to test the SQLite storage engine """
+
+    path = 'test.db'
+
+    def test_pragmas(self):
+        """ Connections run in WAL mode with foreign keys enforced """
+        with self.storage.engine.connect() as conn:
+            self.assertEqual(
+                conn.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+            self.assertEqual(
+                conn.execute(text('PRAGMA foreign_keys')).scalar(), 1)
+            self.assertEqual(
+                conn.execute(text('PRAGMA synchronous')).scalar(), 1)
+
+    def test_foreign_key_indexes(self):
+        """ Every foreign key column gets an index """
+        indexes = inspect(self.storage.engine).get_indexes('cities')
+        self.assertIn(['state_id'], [i['column_names'] for i in indexes])
+
+    def test_save_and_get(self):
+        """ Saved objects are found again after a new session """
+        state = State()
+        state.name = 'California'
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(State, state.id).name,
+                         'California')
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_count_one_statement(self):
+        """ Counting every class is a single statement """
+        self.add_states('Arizona', 'Nevada')
+        self.statements.clear()
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn('UNION ALL', self.statements[0])
+
+    def test_count_approximate(self):
+        """ Approximate counts come from the table statistics """
+        self.add_states('Arizona', 'Nevada')
+        self.assertEqual(self.storage.count(State, approximate=True), 2)
+        with self.storage.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+        self.add_states('Utah')
+        self.assertEqual(self.storage.count(State, approximate=True), 2)
+        self.assertEqual(self.storage.count(State), 3)
+        self.assertEqual(self.storage.count(City, approximate=True), 0)
+
+    def test_all_classes(self):
+        """ all() finds committed and pending objects of every class """
+        state = self.add_states('Arizona')[0]
+        self.storage.close()
+        self.storage.reload()
+        objs = self.storage.all()
+        self.assertEqual(list(objs), ['State.' + state.id])
+        self.assertIs(self.storage.get(State, state.id),
+                      objs['State.' + state.id])
+        city = City()
+        city.name = 'Page'
+        city.state_id = state.id
+        self.storage.new(city)
+        self.assertIn('City.' + city.id, self.storage.all())
+
+    def test_all_classes_readers(self):
+        """ all() shares reader threads, serial once the pool runs low """
+        from unittest import mock
+        state = self.add_states('Arizona')[0]
+        self.storage.close()
+        pool = self.storage.engine.pool
+        self.storage.all()
+        readers = self.storage._DBStorage__readers
+        self.assertLessEqual(readers._max_workers, pool.size())
+        self.storage.all()
+        self.assertIs(self.storage._DBStorage__readers, readers)
+        held = [self.storage.engine.connect()
+                for i in range(pool.size() - 1)]
+        try:
+            with mock.patch.object(readers, 'map') as read:
+                self.assertIn('State.' + state.id, self.storage.all())
+            read.assert_not_called()
+        finally:
+            for conn in held:
+                conn.close()
+
+    def test_bulk_insert(self):
+        """ Rows are inserted without building models and committed """
+        rows = ({'name': 'State {}'.format(i)} for i in range(25))
+        result = self.storage.bulk_insert(State, rows, chunk_size=10)
+        self.assertEqual(result.rows, 25)
+        self.assertGreater(result.rate, 0)
+        self.storage.close()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(State), 25)
+        state = self.storage.query(State).first()
+        with self.assertRaises(IntegrityError):
+            self.storage.bulk_insert(State, [{'id': state.id, 'name': 'X'}])
+
+    def test_bulk_upsert(self):
+        """ Existing ids are updated, the others inserted """
+        state = self.add_states('Arizona')[0]
+        self.storage.get(State, state.id)
+        self.storage.bulk_upsert('State', [{'id': state.id, 'name': 'Utah'},
+                                           {'name': 'Nevada'}])
+        self.assertEqual(self.storage.count(State), 2)
+        self.assertEqual(self.storage.get(State, state.id).name, 'Utah')
+        self.assertEqual(
+            self.storage.query(State).filter(id=state.id).first().created_at,
+            state.created_at)
+
+    def test_bulk_upsert_dialect(self):
+        """ Upserting on a dialect without support names it """
+        from unittest import mock
+        with mock.patch.object(self.storage.engine.dialect, 'name',
+                               'oracle'):
+            with self.assertRaisesRegex(ValueError, 'oracle'):
+                self.storage.bulk_upsert(State, [{'name': 'Utah'}])
+        self.assertEqual(self.storage.count(State), 0)
+
+    def add_states(self, *names):
+        """ Stores and commits states with the given names """
+        states = []
+        for name in names:
+            state = State()
+            state.name = name
+            self.storage.new(state)
+            states.append(state)
+        self.storage.save()
+        return states
+
+    def test_session_per_thread(self):
+        """ Threads work in sessions of their own """
+        import threading
+        state = self.add_states('Arizona')[0]
+        seen = []
+
+        def read():
+            """ Loads the state in this thread's session """
+            seen.append(self.storage.query(State).first())
+            self.storage.close()
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        self.assertEqual(seen[0].id, state.id)
+        self.assertIsNot(seen[0], self.storage.query(State).first())
+
+    def test_close_removes_session(self):
+        """ close() hands the connection back and forgets the session """
+        self.add_states('Arizona')
+        self.storage.query(State).first()
+        self.assertEqual(self.storage.pool_info().checked_out, 1)
+        self.storage.close()
+        self.assertEqual(self.storage.pool_info().checked_out, 0)
+        self.assertEqual(self.storage.query(State).first().name, 'Arizona')
+
+    def test_pool_info(self):
+        """ Checkouts and their waits are counted """
+        checkouts = self.storage.pool_info().checkouts
+        self.add_states('Arizona')
+        self.storage.close()
+        info = self.storage.pool_info()
+        self.assertGreater(info.checkouts, checkouts)
+        self.assertGreaterEqual(info.wait_max, 0)
+        self.assertEqual(info.size, 5)
+
+    def test_pool_settings(self):
+        """ The pool is sized from the environment """
+        from unittest import mock
+        env = {'HBNB_DB_POOL_SIZE': '2', 'HBNB_DB_MAX_OVERFLOW': '1',
+               'HBNB_DB_QUERY_CACHE_SIZE': '50'}
+        with mock.patch.dict(os.environ, env):
+            storage = SQLiteStorage(self.path)
+        self.assertEqual(storage.pool_info().size, 2)
+        self.assertEqual(storage.engine.pool._max_overflow, 1)
+        self.assertEqual(storage.engine._compiled_cache.capacity, 50)
+        storage.engine.dispose()
+
+    def test_statements_reused(self):
+        """ get(), count() and all(cls) run statements built once """
+        state = self.add_states('Arizona')[0]
+        self.storage.close()
+        self.assertIs(statement(State, 'get'), statement(State, 'get'))
+        self.assertIs(statement(None, 'count'), statement(None, 'count'))
+        cache = self.storage.engine._compiled_cache
+        self.assertEqual(self.storage.get('State', state.id).name, 'Arizona')
+        self.storage.count()
+        self.storage.all(State)
+        size = len(cache)
+        self.storage.close()
+        self.storage.get(State, state.id)
+        self.storage.count()
+        self.storage.all('State')
+        self.assertEqual(len(cache), size)
+        with self.assertRaises(KeyError):
+            self.storage.get('Dog', state.id)
+
+    def test_ping_idle(self):
+        """ A dead connection idle past the interval is replaced """
+        from unittest import mock
+        with mock.patch.dict(os.environ, {'HBNB_DB_PING_INTERVAL': '60'}):
+            storage = SQLiteStorage(self.path)
+
+        def age(connection, record):
+            """ Makes the returned connection look idle for long """
+            record.info['checked_in'] = 0
+        with storage.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            dead = conn.connection.dbapi_connection
+        event.listen(storage.engine, 'checkin', age)
+        with storage.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        dead.close()
+        with storage.engine.connect() as conn:
+            self.assertEqual(conn.execute(text('SELECT 3')).scalar(), 3)
+        storage.engine.dispose()
+
+
+class test_dbStorageCache(sqliteTests, unittest.TestCase):
+    """ Class to test the object cache in front of get() """
+
+    path = 'cache.db'
+    options = {'cache_size': 2, 'cache_ttl': 60}
+
+    def fill(self):
+        """ Store one state """
+        self.state = self.add(State, name='California')
+
+    def test_hit_after_close(self):
+        """ A cached object comes back in a new session without a query """
+        self.storage.close()
+        first = self.storage.get(State, self.state.id)
+        self.storage.close()
+        self.storage.reload()
+        self.statements.clear()
+        again = self.storage.get('State', self.state.id)
+        self.assertEqual(self.statements, [])
+        self.assertEqual(again.name, 'California')
+        self.assertIsNot(again, first)
+        self.assertEqual(self.storage.cache_info()[:2], (1, 1))
+
+    def test_invalidation(self):
+        """ delete() and save() drop the objects they touch """
+        self.storage.get(State, self.state.id)
+        self.storage.delete(self.state)
+        self.storage.save()
+        self.assertIsNone(self.storage.get(State, self.state.id))
+        self.assertEqual(self.storage.cache_info().hits, 0)
+
+    def test_lru_bound(self):
+        """ The least recently used object is evicted first """
+        others = [self.add(State, name=name)
+                  for name in ('Arizona', 'Nevada')]
+        self.storage.get(State, self.state.id)
+        for state in others:
+            self.storage.get(State, state.id)
+        info = self.storage.cache_info()
+        self.assertEqual((info.maxsize, info.currsize), (2, 2))
+        self.storage.get(State, others[1].id)
+        self.storage.get(State, self.state.id)
+        self.assertEqual(self.storage.cache_info()[:2], (1, 4))
+
+    def test_uncommitted_not_cached(self):
+        """ An object that was never committed is not served after close """
+        state = State()
+        state.name = 'Nevada'
+        self.storage.new(state)
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.storage.close()
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_rollback_uncaches(self):
+        """ A batch rolled back leaves nothing stale in the cache """
+        state = State()
+        state.name = 'Nevada'
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self.storage.new(state)
+                self.storage.get(State, state.id)
+                raise RuntimeError
+        self.assertIsNone(self.storage.get(State, state.id))
+        self.assertEqual(self.storage.get(State, self.state.id).name,
+                         'California')
+
+    def test_close_dirty_uncaches(self):
+        """ Closing a session with changes drops the objects it cached """
+        self.storage.close()
+        state = self.storage.get(State, self.state.id)
+        state.name = 'Oregon'
+        self.storage.close()
+        self.assertEqual(self.storage.cache_info().currsize, 0)
+        self.assertEqual(self.storage.get(State, self.state.id).name,
+                         'California')
+
+    def test_ttl(self):
+        """ Entries expire after the TTL """
+        storage = SQLiteStorage(self.path, cache_ttl=0)
+        storage.reload()
+        storage.get(State, self.state.id)
+        storage.get(State, self.state.id)
+        self.assertEqual(storage.cache_info()[:2], (0, 2))
+        storage.close()
+
+
+class test_dbStorageResultCache(sqliteTests, unittest.TestCase):
+    """ Class to test the result cache of all(cls) and queries """
+
+    path = 'results.db'
+    options = {'result_cache_size': 3, 'result_cache_ttl': 60}
+
+    def fill(self):
+        """ Store two states """
+        self.states = [self.add(State, name=name)
+                       for name in ('California', 'Arizona')]
+        self.storage.close()
+
+    def names(self):
+        """ Returns the state names a listing query finds """
+        return [s.name for s in self.storage.query(State).order_by('name')]
+
+    def test_hit(self):
+        """ A repeated query is answered without the database """
+        self.assertEqual(self.names(), ['Arizona', 'California'])
+        self.storage.close()
+        self.statements.clear()
+        self.assertEqual(self.names(), ['Arizona', 'California'])
+        self.assertEqual(len(self.storage.all(State)), 2)
+        self.assertEqual(len(self.storage.all('State')), 2)
+        self.assertEqual(self.statements, [self.statements[0]])
+        info = self.storage.result_cache_info()
+        self.assertEqual(info[:3], (2, 2, 0.5))
+        self.assertEqual((info.currsize, info.entries), (2, 1))
+
+    def test_invalidation(self):
+        """ A commit drops the results of the tables it changed only """
+        self.names()
+        self.storage.query(City).count()
+        self.add(City, name='Fresno', state_id=self.states[0].id)
+        self.statements.clear()
+        self.assertEqual(self.names(), ['Arizona', 'California'])
+        self.assertEqual(self.statements, [])
+        self.assertEqual(self.storage.query(City).count(), 1)
+        self.add(State, name='Nevada')
+        self.assertEqual(self.names(), ['Arizona', 'California', 'Nevada'])
+        self.storage.bulk_insert(State, [{'name': 'Texas'}])
+        self.assertEqual(self.names()[-1], 'Texas')
+
+    def test_uncommitted(self):
+        """ A session with pending changes neither reads nor fills it """
+        self.names()
+        state = State()
+        state.name = 'Nevada'
+        self.storage.new(state)
+        self.assertEqual(self.names(), ['Arizona', 'California', 'Nevada'])
+        self.storage.delete(state)
+        self.storage.save()
+        self.assertEqual(self.names(), ['Arizona', 'California'])
+        self.assertEqual(self.storage.result_cache_info().hits, 0)
+
+    def test_close_resets(self):
+        """ close() without save() leaves the next request using it """
+        self.names()
+        self.storage.new(State())
+        self.storage.close()
+        self.names()
+        self.assertEqual(self.storage.result_cache_info().hits, 1)
+
+    def test_memory_bound(self):
+        """ Least recently used results go to stay under the bound """
+        self.names()
+        self.storage.query(State).filter(name='Arizona').all()
+        info = self.storage.result_cache_info()
+        self.assertEqual((info.currsize, info.entries), (3, 2))
+        self.storage.query(State).order_by('-name').all()
+        info = self.storage.result_cache_info()
+        self.assertEqual((info.currsize, info.entries), (3, 2))
+        self.add(State, name='Nevada')
+        self.names()
+        self.assertEqual(self.storage.result_cache_info().entries, 1)
+        self.storage.all(State)
+        self.assertEqual(self.storage.result_cache_info().entries, 1)
+
+    def test_ttl_and_off(self):
+        """ Results expire after the TTL, the cache is off by default """
+        storage = SQLiteStorage(self.path, result_cache_size=10,
+                                result_cache_ttl=0)
+        storage.reload()
+        storage.all(State)
+        storage.all(State)
+        self.assertEqual(storage.result_cache_info()[:2], (0, 2))
+        storage.close()
+        from unittest import mock
+        with mock.patch.dict(os.environ, {'HBNB_DB_RESULT_CACHE_SIZE': ''}):
+            storage = SQLiteStorage(self.path)
+        self.assertEqual(storage.result_cache_info().maxsize, 0)
+        storage.engine.dispose()
+
+
+@unittest.skipUnless(os.getenv('HBNB_TYPE_STORAGE') in ('db', 'sqlite'),
+                     'relationships are mapped for database storage only')
+class test_dbStorageEagerLoad(sqliteTests, unittest.TestCase):
+    """ Class to test eager loading of relationships """
+
+    path = 'eager.db'
+
+    def fill(self):
+        """ Store states with cities """
+        for i in range(3):
+            state = State()
+            state.name = 'State {}'.format(i)
+            for j in range(2):
+                city = City()
+                city.name = 'City {}'.format(j)
+                state.cities.append(city)
+            self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.storage.reload()
+
+    def test_all_load(self):
+        """ Cities of every state come in one extra query """
+        states = self.storage.all(State, load=['cities']).values()
+        self.assertEqual(sum(len(s.cities) for s in states), 6)
+        self.assertEqual(len(self.statements), 2)
+
+    def test_query_load(self):
+        """ load() works through the query API and on many-to-one """
+        cities = self.storage.query(City).load('state.cities').all()
+        self.assertEqual(sum(len(c.state.cities) for c in cities), 12)
+        self.assertEqual(len(self.statements), 2)
+
+
+class test_dbStorageReplicas(sqliteTests, unittest.TestCase):
+    """ Class to test routing reads to replicas, SQLite files here """
+
+    path = 'primary.db'
+    replicas = ('replica1.db', 'replica2.db')
+    options = {'cache_size': 0}
+
+    def setUp(self):
+        """ Set up replicas holding one and two states """
+        for i, path in enumerate(self.replicas):
+            replica = SQLiteStorage(path)
+            replica.reload()
+            for j in range(i + 1):
+                store(replica, State, name='Replica {}'.format(i + 1))
+            replica.close()
+            replica.engine.dispose()
+        super().setUp()
+
+    def tearDown(self):
+        """ Remove the replicas too at end of tests """
+        engines = self.storage.replicas
+        super().tearDown()
+        for engine in engines:
+            engine.dispose()
+        for path in self.replicas:
+            remove(path)
+
+    def open(self, **options):
+        """ Returns a storage on the primary reading from the replicas """
+        return super().open(
+            replicas=['sqlite:///' + path for path in self.replicas],
+            **options)
+
+    def primary_count(self):
+        """ Returns the number of states on the primary """
+        with self.storage.engine.connect() as conn:
+            return conn.execute(text('SELECT COUNT(*) FROM states')).scalar()
+
+    def test_round_robin(self):
+        """ Reads take the replicas in turn """
+        self.assertEqual([self.storage.count(State) for i in range(4)],
+                         [1, 2, 1, 2])
+        names = [s.name for s in self.storage.query(State).all()]
+        self.assertEqual(names, ['Replica 1'])
+
+    def test_writes_to_primary(self):
+        """ Writes go to the primary, later reads to the replicas """
+        state = self.add(State, name='California')
+        self.assertEqual(self.primary_count(), 1)
+        self.storage.close()
+        self.assertIsNone(self.storage.get(State, state.id))
+        self.assertEqual({self.storage.count(State) for i in range(2)},
+                         {1, 2})
+
+    def test_read_your_writes(self):
+        """ A session that committed a write reads from the primary """
+        self.storage.close()
+        self.storage = self.open(read_your_writes=True)
+        state = self.add(State, name='California')
+        self.assertEqual(self.storage.get(State, state.id).name,
+                         'California')
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertIn('State.' + state.id, self.storage.all())
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 1)
+        self.assertEqual(self.storage.count(State), 2)
@@ -10,7 +10,7 @@ app = Flask(__name__)
 @app.route("/hbnb_filters", strict_slashes=False)
 def hbnb_filters():
     """Displays the filters on the page."""
-    states = storage.all("State")
+    states = storage.all("State", load=["cities"])
     amenities = storage.all("Amenity")
     return render_template("10-hbnb_filters.html",
                            states=states, amenities=amenities)
@@ -15,12 +15,10 @@ def states():
 @app.route('/states/<id>', strict_slashes=False)
 def state(id):
     """Display a HTML page with the state and its cities"""
-    states = storage.all(State).values()
-    state = None
-    for s in states:
-        if s.id == id:
-            state = s
-            break
+    state = storage.query(State).filter(id=id).first()
+    states = None
+    if state is None:
+        states = storage.all(State).values()
     return render_template('9-states.html', states=states, state=state)
 
 @app.teardown_appcontext